@@ -3,7 +3,7 @@
 """Views for all requests."""
 
 from django.conf import settings
-from djtools.utils.workday import get_managers
+from djbeca.core.workday import get_managers
 
 
 def sitevars(request):
@@ -11,8 +11,6 @@ def sitevars(request):
     user = request.user
     context = {}
     context['osp'] = user.groups.filter(name=settings.OSP_GROUP).exists()
-    for dean in get_managers('deans'):
-        if request.user.id == dean['id']:
-            context['dean'] = True
-            break
+    if user.is_authenticated and get_managers('deans', cid=user.id):
+        context['dean'] = True
     return context
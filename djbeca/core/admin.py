@@ -18,8 +18,9 @@ from djbeca.core.models import ProposalImpact
 class GenericChoiceAdmin(admin.ModelAdmin):
     """GenericChoice admin class."""
 
-    list_display = ('name', 'value', 'rank', 'active', 'admin')
-    list_editable = ('active', 'admin')
+    list_display = ('name', 'value', 'rank', 'active', 'admin', 'group')
+    list_editable = ('active', 'admin', 'group')
+    list_filter = ('group',)
     formfield_overrides = {
         models.ManyToManyField: {'widget': CheckboxSelectMultiple},
     }
@@ -47,6 +48,7 @@ class ProposalAdmin(admin.ModelAdmin):
         'user__last_name', 'user__first_name', 'user__email', 'user__username',
     )
     list_per_page = 500
+    list_select_related = ('user',)
     raw_id_fields = ('user',)
 
     class Media:
@@ -75,15 +77,20 @@ class ProposalContactAdmin(admin.ModelAdmin):
     """Proposal contacts admin class."""
 
     list_per_page = 500
+    list_select_related = ('proposal',)
     raw_id_fields = ('proposal',)
     date_hierarchy = 'created_at'
-    list_display = ('name', 'email', 'institution', 'created_at', 'proposal')
+    list_display = (
+        'name', 'email', 'institution', 'role', 'created_at', 'proposal',
+    )
+    list_filter = ('role',)
 
 
 class ProposalApproverAdmin(admin.ModelAdmin):
     """Proposal approver admin class."""
 
     list_per_page = 500
+    list_select_related = ('proposal', 'user')
     raw_id_fields = ('proposal', 'user')
     list_display = ('title', 'last_name', 'first_name', 'email')
 
@@ -106,6 +113,7 @@ class ProposalImpactAdmin(admin.ModelAdmin):
     """Proposal impacts admin class."""
 
     list_per_page = 500
+    list_select_related = ('proposal',)
     raw_id_fields = ('proposal',)
     list_display = (
         'title',
@@ -0,0 +1,221 @@
+# -*- coding: utf-8 -*-
+
+"""Time that proposals wait in each approval stage.
+
+The waits are computed from the proposal events: a stage starts when
+Part A or Part B is submitted, or for the VP for Business and the
+Provost when the last Part B approval before theirs is given, and it
+ends with the approval. The sla_rollup command summarizes them into one
+set of StageRollup rows per day for the report.
+"""
+
+import datetime
+import math
+from collections import defaultdict
+from itertools import groupby
+
+from django.conf import settings
+from django.db import transaction
+from djbeca.core import choices
+from djbeca.core.models import PendingAction
+from djbeca.core.models import ProposalApprover
+from djbeca.core.models import ProposalEvent
+from djbeca.core.models import StageRollup
+
+
+# the event that completes each stage
+COMPLETES = {
+    choices.EVENT_PART_A_DEAN: 'level3a',
+    choices.EVENT_PART_A_APPROVER: 'step1',
+    choices.EVENT_PART_B_DEAN: 'level3b',
+    choices.EVENT_PART_B_APPROVER: 'step2',
+    choices.EVENT_PART_B_CFO: 'level2',
+    choices.EVENT_PART_B_PROVOST: 'level1',
+}
+# events that end a round of approvals
+RESETS = frozenset((
+    choices.EVENT_CLOSED,
+    choices.EVENT_REOPENED,
+    choices.EVENT_DECLINED,
+    choices.EVENT_NEEDS_WORK,
+))
+
+
+def proposal_waits(events):
+    """Yield (stage, actor ID, start, end) for the approvals of a proposal.
+
+    events are the (event, actor ID, created_at) of one proposal in the
+    order that they happened.
+    """
+    part_a = None
+    part_b = None
+    ready = None
+    for event, actor, created_at in events:
+        if event in RESETS:
+            part_a = None
+            part_b = None
+            ready = None
+        elif event == choices.EVENT_PART_A_SUBMITTED:
+            part_a = created_at
+        elif event == choices.EVENT_PART_A_UPDATED and part_a is None:
+            # the first save after a reset resubmits Part A
+            part_a = created_at
+        elif event == choices.EVENT_PART_B_SUBMITTED:
+            part_b = created_at
+            ready = None
+        elif event in COMPLETES:
+            stage = COMPLETES[event]
+            if stage in {'level3a', 'step1'}:
+                start = part_a
+            elif stage in {'level3b', 'step2'}:
+                start = part_b
+                ready = created_at
+            else:
+                start = ready
+            # history that started mid-round has no start
+            if start is not None:
+                yield stage, actor, start, created_at
+
+
+def completed_waits(start, end):
+    """The approvals given from start until end, as dictionaries.
+
+    The events of every proposal with an approval in the period are
+    read in one query, ordered by the (proposal, created_at) index.
+    """
+    pids = ProposalEvent.objects.filter(
+        event__in=list(COMPLETES),
+        created_at__gte=start,
+        created_at__lt=end,
+    ).values('proposal')
+    rows = ProposalEvent.objects.filter(proposal__in=pids).order_by(
+        'proposal', 'created_at', 'id',
+    ).values_list(
+        'proposal_id',
+        'proposal__department',
+        'proposal__grant_deadline_date',
+        'event',
+        'actor_id',
+        'created_at',
+    )
+    waits = []
+    for key, events in groupby(rows, key=lambda row: row[:3]):
+        pid, department, deadline = key
+        for stage, actor, begun, done in proposal_waits(
+            row[3:] for row in events
+        ):
+            if start <= done < end:
+                waits.append({
+                    'proposal': pid,
+                    'stage': stage,
+                    'department': department,
+                    'approver': actor,
+                    'hours': (done - begun).total_seconds() / 3600,
+                    'late': done.date() > deadline,
+                })
+    return waits
+
+
+def pending_waits(day):
+    """The approvals that users still have to give, as dictionaries.
+
+    The pending actions inbox is the current state of the workflow, so
+    these are the waits at the time that this runs, and day, which must
+    be today, only decides which are overdue.
+    """
+    rows = PendingAction.objects.exclude(action='impact').values_list(
+        'proposal_id',
+        'proposal__department',
+        'proposal__grant_deadline_date',
+        'action',
+        'user_id',
+    )
+    approvers = set(
+        ProposalApprover.objects.filter(
+            proposal__closed=False, proposal__decline=False,
+        ).values_list('proposal_id', 'user_id'),
+    )
+    waits = []
+    for pid, department, deadline, action, uid in rows:
+        approver = (pid, uid) in approvers
+        if action == 'step1':
+            stage = 'step1' if approver else 'level3a'
+        elif action == 'step2':
+            stage = 'step2' if approver else 'level3b'
+        else:
+            stage = action
+        waits.append({
+            'proposal': pid,
+            'stage': stage,
+            'department': department,
+            'approver': uid,
+            'overdue': deadline < day,
+        })
+    return waits
+
+
+def _percentile(hours, fraction):
+    """Nearest-rank percentile of a sorted list."""
+    return round(hours[max(0, math.ceil(fraction * len(hours)) - 1)], 1)
+
+
+def _groups(wait):
+    """The rollup rows that a wait counts towards."""
+    stage = wait['stage']
+    groups = [(stage, '', None), (stage, wait['department'], None)]
+    if wait['approver']:
+        groups.append((stage, '', wait['approver']))
+    return groups
+
+
+@transaction.atomic
+def build_rollups(day):
+    """Replace the StageRollup rows of a day.
+
+    The approvals are those completed in the SLA_WINDOW_DAYS that end on
+    the day. The waiting approvals are only known for today, so a past
+    day keeps the pending and overdue counts that it was built with.
+    """
+    end = datetime.datetime.combine(
+        day + datetime.timedelta(days=1), datetime.time.min,
+    )
+    start = end - datetime.timedelta(days=settings.SLA_WINDOW_DAYS)
+    totals = defaultdict(
+        lambda: {'hours': [], 'late': 0, 'pending': 0, 'overdue': 0},
+    )
+    for wait in completed_waits(start, end):
+        for group in _groups(wait):
+            totals[group]['hours'].append(wait['hours'])
+            totals[group]['late'] += wait['late']
+    if day == datetime.date.today():
+        for wait in pending_waits(day):
+            for group in _groups(wait):
+                totals[group]['pending'] += 1
+                totals[group]['overdue'] += wait['overdue']
+    else:
+        built = StageRollup.objects.filter(day=day).values_list(
+            'stage', 'department', 'approver_id', 'pending', 'overdue',
+        )
+        for stage, department, approver, pending, overdue in built:
+            total = totals[(stage, department, approver)]
+            total['pending'] = pending
+            total['overdue'] = overdue
+    rollups = []
+    for (stage, department, approver), total in totals.items():
+        hours = sorted(total['hours'])
+        rollups.append(StageRollup(
+            day=day,
+            stage=stage,
+            department=department,
+            approver_id=approver,
+            completed=len(hours),
+            p50_hours=_percentile(hours, 0.5) if hours else None,
+            p90_hours=_percentile(hours, 0.9) if hours else None,
+            max_hours=round(hours[-1], 1) if hours else None,
+            late=total['late'],
+            pending=total['pending'],
+            overdue=total['overdue'],
+        ))
+    StageRollup.objects.filter(day=day).delete()
+    StageRollup.objects.bulk_create(rollups, batch_size=500)
+    return len(rollups)
@@ -119,3 +119,72 @@ FUNDS_CHOICES = (
     ('New Funds', 'New Funds'),
     ('Exisiting Funds', 'Exisiting Funds'),
 )
+DASHBOARD_STATUS_CHOICES = (
+    ('', '----status----'),
+    ('level3', 'Awaiting Dean/VP approval'),
+    ('impact', 'Awaiting Part B'),
+    ('level1', 'Awaiting VP for Business/Provost'),
+    ('approved', 'Part B approved'),
+    ('declined', 'Declined'),
+    ('closed', 'Closed'),
+    ('awarded', 'Awarded'),
+)
+WORKDAY_MANAGER_CHOICES = (
+    ('deans', 'Division Dean'),
+    ('chairs', 'Department Chair'),
+)
+PENDING_ACTION_CHOICES = (
+    ('step1', 'Approve Part A'),
+    ('impact', 'Complete Part B'),
+    ('step2', 'Approve Part B'),
+    ('level2', 'Authorize Part B as VP for Business'),
+    ('level1', 'Authorize Part B as Provost'),
+)
+GENERIC_CHOICE_GROUP_CHOICES = (
+    ('subcontracts', 'Subcontracts'),
+)
+CONTACT_ROLE_CHOICES = (
+    ('co_principal', 'Co-Principal Investigator'),
+)
+# proposal workflow events, stored as small integers
+EVENT_PART_A_SUBMITTED = 1
+EVENT_PART_A_UPDATED = 2
+EVENT_PART_B_SAVED = 3
+EVENT_PART_B_SUBMITTED = 4
+EVENT_PART_A_DEAN = 10
+EVENT_PART_A_APPROVER = 11
+EVENT_PART_B_DEAN = 12
+EVENT_PART_B_APPROVER = 13
+EVENT_PART_B_CFO = 14
+EVENT_PART_B_PROVOST = 15
+EVENT_AWARDED = 16
+EVENT_CLOSED = 20
+EVENT_REOPENED = 21
+EVENT_DECLINED = 22
+EVENT_NEEDS_WORK = 23
+PROPOSAL_EVENT_CHOICES = (
+    (EVENT_PART_A_SUBMITTED, 'Part A submitted'),
+    (EVENT_PART_A_UPDATED, 'Part A updated'),
+    (EVENT_PART_B_SAVED, 'Part B saved'),
+    (EVENT_PART_B_SUBMITTED, 'Part B submitted'),
+    (EVENT_PART_A_DEAN, 'Part A approved by Dean/VP'),
+    (EVENT_PART_A_APPROVER, 'Part A approved by approver'),
+    (EVENT_PART_B_DEAN, 'Part B approved by Division Dean'),
+    (EVENT_PART_B_APPROVER, 'Part B approved by approver'),
+    (EVENT_PART_B_CFO, 'Part B approved by VP for Business'),
+    (EVENT_PART_B_PROVOST, 'Part B approved by Provost'),
+    (EVENT_AWARDED, 'Awarded'),
+    (EVENT_CLOSED, 'Closed'),
+    (EVENT_REOPENED, 'Reopened'),
+    (EVENT_DECLINED, 'Declined'),
+    (EVENT_NEEDS_WORK, 'Needs work'),
+)
+# approval stages measured by the SLA report
+SLA_STAGE_CHOICES = (
+    ('level3a', 'Part A: Dean/VP'),
+    ('step1', 'Part A: approvers'),
+    ('level3b', 'Part B: Division Dean'),
+    ('step2', 'Part B: approvers'),
+    ('level2', 'Part B: VP for Business'),
+    ('level1', 'Part B: Provost'),
+)
@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+
+"""Co-Principal Investigators submitted with the Part A form."""
+
+from django.contrib.contenttypes.models import ContentType
+from django.db import transaction
+from djbeca.core.models import ProposalContact
+from taggit.models import Tag
+from taggit.models import TaggedItem
+
+
+CO_PRINCIPAL_ROLE = 'co_principal'
+# tags remain for ad-hoc use
+CO_PRINCIPAL_TAG = 'Co-Principal Investigators'
+# number of name and institution pairs on the InvestigatorsForm
+INVESTIGATOR_SLOTS = 5
+
+
+def co_principals(proposal):
+    """The Co-Principal Investigators of a proposal in form order.
+
+    Contacts that materialize_roles has not yet given a role are found
+    by their tag, so a proposal shows them before the backfill has run.
+    """
+    contacts = proposal.contact.order_by('created_at', 'id')
+    current = contacts.filter(role=CO_PRINCIPAL_ROLE)
+    if current.exists():
+        return current
+    return contacts.filter(role__isnull=True, tags__name=CO_PRINCIPAL_TAG)
+
+
+@transaction.atomic
+def sync_investigators(proposal, data):
+    """Make the Co-Principal Investigators match the submitted form.
+
+    data is the cleaned data of the InvestigatorsForm. Each slot on the
+    form is paired with the existing contact in the same position, so
+    only the contacts that changed are written, with one bulk_update and
+    one bulk_create, and a new contact is tagged with one batched insert.
+    Contacts found only by their tag are given the role as they are
+    written, rather than duplicated.
+    """
+    existing = list(co_principals(proposal))
+    create = []
+    update = []
+    for slot in range(1, INVESTIGATOR_SLOTS + 1):
+        name = data.get('name{0}'.format(slot))
+        institution = data.get('institution{0}'.format(slot))
+        if slot <= len(existing):
+            contact = existing[slot - 1]
+            if (contact.name, contact.institution, contact.role) != (
+                name, institution, CO_PRINCIPAL_ROLE,
+            ):
+                contact.name = name
+                contact.institution = institution
+                contact.role = CO_PRINCIPAL_ROLE
+                update.append(contact)
+        else:
+            create.append(ProposalContact(
+                proposal=proposal,
+                name=name,
+                institution=institution,
+                role=CO_PRINCIPAL_ROLE,
+            ))
+    # contacts beyond the slots on the form
+    extra = [contact.id for contact in existing[INVESTIGATOR_SLOTS:]]
+    if extra:
+        ProposalContact.objects.filter(pk__in=extra).delete()
+    if update:
+        ProposalContact.objects.bulk_update(
+            update, ['name', 'institution', 'role'],
+        )
+    if create:
+        before = set(proposal.contact.values_list('id', flat=True))
+        ProposalContact.objects.bulk_create(create)
+        # MySQL does not return the primary keys of a bulk insert
+        _tag(
+            proposal.contact.exclude(pk__in=before).values_list(
+                'id', flat=True,
+            ),
+            CO_PRINCIPAL_TAG,
+        )
+
+
+def _tag(cids, name):
+    """Tag contacts with one insert into the taggit through table."""
+    tag, _ = Tag.objects.get_or_create(name=name)
+    ctype = ContentType.objects.get_for_model(ProposalContact)
+    TaggedItem.objects.bulk_create([
+        TaggedItem(tag=tag, content_type=ctype, object_id=cid)
+        for cid in cids
+    ])
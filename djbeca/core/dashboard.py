@@ -0,0 +1,137 @@
+# -*- coding: utf-8 -*-
+
+"""Per-user cache of the rendered dashboard rows.
+
+Each entry records the generation counters that it was built from. A
+change to a proposal increments the counters of the users who can see
+it, plus the counter that all OSP users share, so an entry is stale as
+soon as its counters no longer match. The counters live in the cache,
+which all worker processes share, and an entry and its counters are
+read with a single get_many.
+"""
+
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+from django.template.loader import render_to_string
+from djbeca.core import roles
+from djbeca.core import workday
+from djbeca.core.models import ProposalApprover
+from djbeca.core.models import WorkdayManager
+from djbeca.core.utils import get_dashboard_page
+from djbeca.core.utils import get_proposals
+
+
+# generation of every proposal, for the OSP dashboards that show them all
+GENERATION_ALL = 'dashboard_gen_all'
+# generation of every dashboard, for changes like the name of a user
+GENERATION_EVERYONE = 'dashboard_gen_everyone'
+
+
+def _generation_key(uid):
+    """Cache key for the generation of the dashboard of a user."""
+    return 'dashboard_gen_{0}'.format(uid)
+
+
+def _entry_key(uid, filters):
+    """Cache key for the rows of a user for a set of filters."""
+    signature = repr(sorted(filters.items()))
+    return 'dashboard_{0}_{1}'.format(
+        uid, hashlib.md5(signature.encode()).hexdigest(),
+    )
+
+
+def _generation(counters, uid, osp):
+    """The counters that an entry for the user depends on."""
+    return (
+        counters.get(_generation_key(uid)),
+        counters.get(GENERATION_ALL) if osp else None,
+        counters.get(GENERATION_EVERYONE),
+        counters.get(roles.VERSION_KEY),
+        counters.get(workday.VERSION_KEY),
+    )
+
+
+def dashboard_rows(request, filters):
+    """Return the rendered rows and the next cursor for the filters.
+
+    A repeat request with nothing changed is one cache read. Otherwise
+    the rows are fetched and rendered, and cached with the counters that
+    were read before the fetch, so that a change made in the meantime
+    makes the new entry stale.
+    """
+    user = request.user
+    key = _entry_key(user.id, filters)
+    counters = cache.get_many([
+        key,
+        _generation_key(user.id),
+        GENERATION_ALL,
+        GENERATION_EVERYONE,
+        roles.VERSION_KEY,
+        workday.VERSION_KEY,
+    ])
+    entry = counters.get(key)
+    if entry and entry['generation'] == _generation(
+        counters, user.id, entry['osp'],
+    ):
+        return entry
+
+    osp = roles.get_roles(user)['osp']
+    proposals = get_proposals(user)
+    page = get_dashboard_page(user, proposals['objects'], filters)
+    entry = {
+        'html': render_to_string(
+            'data_rows.inc.html',
+            {'proposals': page['objects'], 'group': osp},
+            request=request,
+        ),
+        'next': page['next'],
+        'osp': osp,
+        # the sizes of the OSP work queues
+        'counts': proposals['objects'].stage_counts() if osp else None,
+        'generation': _generation(counters, user.id, osp),
+    }
+    cache.set(key, entry, settings.DASHBOARD_CACHE_TIMEOUT)
+    return entry
+
+
+def _increment(key):
+    """Increment a generation counter."""
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, 1, None)
+
+
+def expire_dashboards(uids):
+    """Make the cached dashboards of some users, and of OSP, stale."""
+    for uid in set(uids):
+        _increment(_generation_key(uid))
+    _increment(GENERATION_ALL)
+
+
+def expire_all_dashboards():
+    """Make every cached dashboard stale."""
+    _increment(GENERATION_EVERYONE)
+
+
+def proposal_viewers(proposal):
+    """IDs of the users other than OSP whose dashboards show a proposal."""
+    uids = {proposal.user_id}
+    uids.update(
+        ProposalApprover.objects.filter(
+            proposal=proposal,
+        ).values_list('user_id', flat=True),
+    )
+    uids.update(department_viewers(proposal.department))
+    return uids
+
+
+def department_viewers(department):
+    """IDs of the deans and chairs of a department."""
+    return set(
+        WorkdayManager.objects.filter(
+            department_id=department,
+        ).values_list('cid', flat=True),
+    )
@@ -0,0 +1,28 @@
+# -*- coding: utf-8 -*-
+
+"""Append-only history of the proposal workflow transitions."""
+
+from djbeca.core.models import ProposalEvent
+
+
+def record_event(proposal, actor, event):
+    """Append an event to the history of a proposal."""
+    return ProposalEvent.objects.create(
+        proposal=proposal, actor=actor, event=event,
+    )
+
+
+def timeline(proposal):
+    """The events of a proposal in order, for display.
+
+    One query on the (proposal, created_at) index, which returns tuples
+    of the event code, the time, and the name of the actor rather than
+    model instances.
+    """
+    return list(
+        ProposalEvent.objects.filter(proposal=proposal).order_by(
+            'created_at', 'id',
+        ).values_list(
+            'event', 'created_at', 'actor__first_name', 'actor__last_name',
+        ),
+    )
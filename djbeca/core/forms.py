@@ -1,31 +1,126 @@
 # -*- coding: utf-8 -*-
 
 import datetime
+from functools import partial
 
 from django import forms
 from django.conf import settings
 from django.contrib.auth.models import User
+from django.core.exceptions import FieldDoesNotExist
+from django.db import models
 from djauth.managers import LDAPManager
 from djbeca.core import choices
-from djbeca.core.models import GenericChoice
 from djbeca.core.models import Proposal
 from djbeca.core.models import ProposalBudget
 from djbeca.core.models import ProposalDocument
 from djbeca.core.models import ProposalImpact
+from djbeca.core.registry import generic_choices
+from djbeca.core.utils import claim_version
 from djbeca.core.utils import get_proposals
 from djtools.fields import BINARY_CHOICES
 from djtools.utils.workday import get_peep
 from djtools.utils.workday import get_peeps
 
 
-SUBCONTRACTS_CHOICES = GenericChoice.objects.filter(
-    tags__name__in=['Subcontracts'],
-).filter(active=True).order_by('rank')
+class VersionedModelForm(forms.ModelForm):
+    """Model form that detects edits saved by someone else meanwhile.
 
+    The version of the instance is a hidden field, so the form submits
+    the version that it was loaded with.
+    """
 
-class ProposalForm(forms.ModelForm):
+    # data that is saved with the form but is not one of its fields, so
+    # it cannot be compared and is reported as a whole when stale
+    related_label = None
+
+    def __init__(self, *args, **kwargs):
+        """Add the hidden version field."""
+        super(VersionedModelForm, self).__init__(*args, **kwargs)
+        # a missing version is a conflict rather than a hidden error
+        self.fields['version'] = forms.IntegerField(
+            widget=forms.HiddenInput(),
+            required=False,
+            initial=self.instance.version,
+        )
+
+    def edit_conflicts(self):
+        """Claim the next version, or list the fields that conflict.
+
+        Call this on a valid form before saving it. An empty list means
+        that the instance is new or nobody else has saved it, and the
+        save can go ahead. Otherwise it is a list of (label, mine,
+        theirs) for the fields on which the form differs from the saved
+        instance, and the form now carries the saved version, so that
+        submitting it again overwrites the other edits. A form submitted
+        without its version is treated as loaded before any other save.
+        """
+        instance = self.instance
+        if instance.pk is None:
+            return []
+        expected = self.cleaned_data.get('version')
+        if expected is not None and claim_version(instance, expected):
+            return []
+        current = type(instance).objects.get(pk=instance.pk)
+        conflicts = []
+        for name, field in self.fields.items():
+            if name == 'version' or name not in self.cleaned_data:
+                continue
+            try:
+                model_field = current._meta.get_field(name)
+            except FieldDoesNotExist:
+                continue
+            conflict = self._conflict(
+                field, model_field, self.cleaned_data[name], current,
+            )
+            if conflict:
+                conflicts.append((field.label or name,) + conflict)
+        if self.related_label:
+            conflicts.append((
+                self.related_label,
+                'As you submitted them',
+                'Possibly changed by someone else',
+            ))
+        if not conflicts:
+            # the other edits agree with this one, so claim their version
+            self.cleaned_data['version'] = current.version
+            return self.edit_conflicts()
+        self.data = self.data.copy()
+        self.data[self.add_prefix('version')] = current.version
+        return conflicts
+
+    def _conflict(self, field, model_field, mine, current):
+        """The (mine, theirs) values of a field if they differ, or None."""
+        name = model_field.name
+        if model_field.many_to_many:
+            theirs = list(getattr(current, name).all())
+            mine = list(mine or [])
+            if {getattr(value, 'pk', value) for value in mine} == {
+                obj.pk for obj in theirs
+            }:
+                return None
+            labels = dict(getattr(field, 'choices', ()))
+            return (
+                ', '.join(str(labels.get(value, value)) for value in mine),
+                ', '.join(str(obj) for obj in theirs),
+            )
+        theirs = getattr(current, name)
+        if isinstance(model_field, models.FileField):
+            loaded = self.initial.get(name)
+            # only a new upload replaces the file, and only a replacement
+            # saved meanwhile would be lost
+            if mine is loaded or str(theirs) == str(loaded or ''):
+                return None
+            return (getattr(mine, 'name', mine), str(theirs))
+        if mine == theirs:
+            return None
+        return (mine, theirs)
+
+
+class ProposalForm(VersionedModelForm):
     """Proposal form for the data model."""
 
+    related_label = 'Co-Principal Investigators'
+
     def __init__(self, department_choices, *args, **kwargs):
         """Set the department field choices."""
         super(ProposalForm, self).__init__(*args, **kwargs)
@@ -122,9 +217,11 @@ class InvestigatorsForm(forms.Form):
     institution5 = forms.CharField(required=False)
 
 
-class BudgetForm(forms.ModelForm):
+class BudgetForm(VersionedModelForm):
     """Proposal Budget form."""
 
+    related_label = 'Funding sources and documents'
+
     class Meta:
         """Attributes about the form class."""
 
@@ -134,7 +231,7 @@ class BudgetForm(forms.ModelForm):
         )
 
 
-class ImpactForm(forms.ModelForm):
+class ImpactForm(VersionedModelForm):
     """Proposal impact form."""
 
     institutional_funds = forms.TypedChoiceField(
@@ -149,9 +246,11 @@ class ImpactForm(forms.ModelForm):
         choices=BINARY_CHOICES,
         widget=forms.RadioSelect(),
     )
-    subcontracts = forms.ModelMultipleChoiceField(
+    # the choices come from the registry, so building the form runs no query
+    subcontracts = forms.TypedMultipleChoiceField(
         label="Does your proposal include any of the following?",
-        queryset=SUBCONTRACTS_CHOICES,
+        choices=partial(generic_choices, 'subcontracts'),
+        coerce=int,
         widget=forms.CheckboxSelectMultiple(),
         help_text="Check all that apply.",
         required=False,
@@ -255,6 +354,14 @@ class ImpactForm(forms.ModelForm):
     )
     disclosure_assurance = forms.BooleanField(required=True)
 
+    def __init__(self, *args, **kwargs):
+        """Use the IDs of the selected subcontracts as initial data."""
+        super(ImpactForm, self).__init__(*args, **kwargs)
+        if self.initial.get('subcontracts'):
+            self.initial['subcontracts'] = [
+                choice.pk for choice in self.initial['subcontracts']
+            ]
+
     class Meta:
         """Attributes about the form class."""
 
@@ -324,7 +431,8 @@ class ProposalApproverForm(forms.Form):
     def __init__(self, *args, **kwargs):
         """Set up choices for select field."""
         super(ProposalApproverForm, self).__init__(*args, **kwargs)
-        # populate the approvers select field with faculty/staff
+        # populate the approvers select field with faculty/staff. the local
+        # Workday copy has no names, so this one still asks Workday
         facstaff = get_peeps(who=False, choices=True)
         self.fields['user'].choices = facstaff
 
@@ -356,3 +464,30 @@ class EmailInvestigatorForm(forms.Form):
     """Send an email to investigator form."""
 
     content = forms.CharField(widget=forms.Textarea, label="Email content")
+
+
+class DashboardFilterForm(forms.Form):
+    """Dashboard filters and keyset cursor."""
+
+    status = forms.ChoiceField(
+        choices=choices.DASHBOARD_STATUS_CHOICES,
+        required=False,
+    )
+    department = forms.CharField(max_length=12, required=False)
+    deadline_from = forms.DateField(required=False)
+    deadline_to = forms.DateField(required=False)
+    cursor = forms.CharField(required=False, widget=forms.HiddenInput())
+
+    def clean_cursor(self):
+        """Split the cursor into the deadline date and proposal ID."""
+        cursor = self.cleaned_data.get('cursor')
+        if cursor:
+            try:
+                deadline, pid = cursor.split('.')
+                cursor = (
+                    datetime.datetime.strptime(deadline, '%Y-%m-%d').date(),
+                    int(pid),
+                )
+            except ValueError:
+                raise forms.ValidationError("That is not a valid cursor")
+        return cursor or None
@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+
+"""Budget funding sources submitted with the Part B form."""
+
+from decimal import Decimal
+from decimal import InvalidOperation
+from re import sub
+
+from django.db import transaction
+from django.utils import timezone
+from djbeca.core.models import ProposalBudgetFunding
+
+
+FIELDS = ('amount', 'source', 'status', 'updated_at')
+
+
+def parse_amount(amount):
+    """Strip any non-numeric characters from an amount."""
+    try:
+        return Decimal(sub(r'[^\d.]', '', amount))
+    except InvalidOperation:
+        return Decimal(0)
+
+
+def funding_rows(post):
+    """Return the funding source rows from the POST data.
+
+    Each row is a dictionary with the 'id' of an existing funding source
+    or None, and the raw 'amount', 'source', and 'status' values, so the
+    rows can also be displayed again if the form is not valid.
+    """
+    sids = post.getlist('sid[]')
+    amounts = post.getlist('amount[]')
+    sources = post.getlist('source[]')
+    statuses = post.getlist('status[]')
+    rows = []
+    # skip the doop-master container
+    for index in range(1, len(sids)):
+        try:
+            fid = int(sids[index])
+        except ValueError:
+            fid = None
+        rows.append({
+            'id': fid,
+            'amount': amounts[index],
+            'source': sources[index],
+            'status': statuses[index],
+        })
+    return rows
+
+
+@transaction.atomic
+def sync_funding(budget, rows):
+    """Make the funding sources of a budget match the submitted rows.
+
+    The rows are compared with the existing funding sources in memory
+    and the difference is written with at most one delete, one update,
+    and one insert, whatever the number of rows.
+    """
+    existing = {funding.id: funding for funding in budget.funding.all()}
+    create = []
+    update = []
+    for row in rows:
+        funding = existing.pop(row['id'], None)
+        if funding is None:
+            funding = ProposalBudgetFunding(budget=budget)
+        changed = False
+        # a blank amount leaves the amount as it is
+        if row['amount']:
+            changed |= _set(funding, 'amount', parse_amount(row['amount']))
+        changed |= _set(funding, 'source', row['source'])
+        changed |= _set(funding, 'status', row['status'])
+        if funding.pk is None:
+            create.append(funding)
+        elif changed:
+            # bulk_update does not set auto_now fields
+            funding.updated_at = timezone.now()
+            update.append(funding)
+    # the ones that are no longer submitted were removed
+    if existing:
+        ProposalBudgetFunding.objects.filter(pk__in=list(existing)).delete()
+    if update:
+        ProposalBudgetFunding.objects.bulk_update(update, FIELDS)
+    if create:
+        ProposalBudgetFunding.objects.bulk_create(create)
+
+
+def _set(funding, field, value):
+    """Set a field and report whether its value changed."""
+    if getattr(funding, field) == value:
+        return False
+    setattr(funding, field, value)
+    return True
@@ -0,0 +1,118 @@
+# -*- coding: utf-8 -*-
+
+"""Pending actions inbox maintained on every workflow transition."""
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db.models import Q
+from djbeca.core.models import PendingAction
+from djbeca.core.models import Proposal
+from djbeca.core.models import ProposalImpact
+from djbeca.core.models import WorkdayManager
+from djbeca.core.roles import get_group_user
+
+
+def pending_actions(proposal):
+    """Return the set of (user ID, action) pairs a proposal is waiting on.
+
+    This follows the approval workflow in the proposal_status view: Part A
+    is approved by the Division Dean and the ad-hoc approvers, the PI then
+    completes Part B, which the Dean and the approvers approve before the
+    VP for Business and the Provost authorize it.
+    """
+    if proposal.closed or proposal.decline:
+        return set()
+    approvers = list(proposal.approvers.all())
+    # deans who have an account
+    deans = User.objects.filter(
+        pk__in=WorkdayManager.objects.filter(
+            role='deans', department_id=proposal.department,
+        ).values('cid'),
+    ).values_list('id', flat=True)
+    pending = set()
+    if not proposal.level3:
+        pending.update((cid, 'step1') for cid in deans)
+        pending.update(
+            (approver.user_id, 'step1') for approver in approvers
+            if approver.steps in {'1', '3'} and not approver.step1
+        )
+        return pending
+    try:
+        impact = proposal.impact
+    except ProposalImpact.DoesNotExist:
+        impact = None
+    if not impact or not proposal.save_submit:
+        pending.add((proposal.user_id, 'impact'))
+        return pending
+    if not impact.level3:
+        pending.update((cid, 'step2') for cid in deans)
+    waiting = [
+        approver for approver in approvers
+        if approver.steps in {'2', '3'} and not approver.step2
+    ]
+    pending.update((approver.user_id, 'step2') for approver in waiting)
+    # the same test as Proposal.ready_level1()
+    if impact.level3 and all(approver.step2 for approver in approvers):
+        for level, group in (
+            ('level2', settings.CFO_GROUP),
+            ('level1', settings.PROVOST_GROUP),
+        ):
+            officer = get_group_user(group)
+            if officer and not getattr(impact, level):
+                pending.add((officer.id, level))
+    return pending
+
+
+def sync_pending_actions(proposal):
+    """Bring the inbox rows of a proposal up to date.
+
+    Only rows that changed are written, so calling this after every save
+    in a transition is cheap.
+    """
+    if isinstance(proposal, int):
+        proposal = Proposal.objects.filter(pk=proposal).first()
+        if proposal is None:
+            return
+    rows = PendingAction.objects.filter(proposal=proposal)
+    current = {
+        (row['user_id'], row['action']): row['id']
+        for row in rows.values('id', 'user_id', 'action')
+    }
+    pending = pending_actions(proposal)
+    stale = [current[key] for key in current.keys() - pending]
+    if stale:
+        PendingAction.objects.filter(pk__in=stale).delete()
+    PendingAction.objects.bulk_create([
+        PendingAction(user_id=uid, proposal=proposal, action=action)
+        for uid, action in pending - current.keys()
+    ])
+
+
+def rebuild_pending_actions():
+    """Rebuild the inbox rows of every open proposal.
+
+    For when the deans, the VP for Business, or the Provost change.
+    """
+    PendingAction.objects.filter(
+        Q(proposal__closed=True) | Q(proposal__decline=True),
+    ).delete()
+    proposals = Proposal.objects.filter(
+        closed=False, decline=False,
+    ).select_related('impact').prefetch_related('approvers')
+    for proposal in proposals.iterator(chunk_size=200):
+        sync_pending_actions(proposal)
+
+
+def rebuild_officer_actions():
+    """Rebuild the inbox rows that wait on the VP for Business or Provost.
+
+    For when the membership of their groups changes.
+    """
+    proposals = Proposal.objects.filter(
+        Q(impact__level2=False) | Q(impact__level1=False),
+        closed=False,
+        decline=False,
+        impact__level3=True,
+    ).select_related('impact').prefetch_related('approvers')
+    for proposal in proposals.iterator(chunk_size=200):
+        sync_pending_actions(proposal)
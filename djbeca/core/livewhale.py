@@ -0,0 +1,111 @@
+# -*- coding: utf-8 -*-
+
+"""Stale-while-revalidate cache for LiveWhale API content."""
+
+import datetime
+import json
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from django.conf import settings
+from django.core.cache import cache
+from requests.adapters import HTTPAdapter
+
+
+logger = logging.getLogger('debug_logfile')
+STATS = ('hit', 'stale', 'miss', 'refresh', 'error')
+# one pooled session and a small pool of threads per worker process
+_session = requests.Session()
+_session.mount('https://', HTTPAdapter(pool_connections=2, pool_maxsize=4))
+_executor = ThreadPoolExecutor(max_workers=2)
+
+
+def _key(ctype, cid):
+    """Cache key for a piece of content."""
+    return 'livewhale_swr_{0}_{1}'.format(ctype, cid)
+
+
+def _count(stat):
+    """Increment a counter that all processes share."""
+    key = 'livewhale_stats_{0}'.format(stat)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, 1, None)
+
+
+def stats():
+    """Return the hit, stale, miss, refresh, and error counters."""
+    counts = cache.get_many(['livewhale_stats_{0}'.format(s) for s in STATS])
+    return {s: counts.get('livewhale_stats_{0}'.format(s), 0) for s in STATS}
+
+
+def refresh(ctype, cid):
+    """Fetch content from the LiveWhale API and cache it.
+
+    Returns the content, or None if the API did not answer in time, or
+    answered with an error status or without JSON, in which case the
+    cached content is kept.
+    """
+    timestamp = datetime.datetime.timestamp(datetime.datetime.now())
+    earl = '{0}/live/{1}/{2}@JSON?cache={3}'.format(
+        settings.LIVEWHALE_API_URL, ctype, cid, timestamp,
+    )
+    try:
+        response = _session.get(
+            earl,
+            headers={'Cache-Control': 'no-cache'},
+            timeout=settings.LIVEWHALE_TIMEOUT,
+        )
+        response.raise_for_status()
+        content = json.loads(response.text)
+    except (requests.RequestException, ValueError) as error:
+        _count('error')
+        logger.debug('livewhale {0} {1}: {2}'.format(ctype, cid, error))
+        return None
+    _count('refresh')
+    # no timeout: stale content is better than none
+    cache.set(
+        _key(ctype, cid), {'content': content, 'fetched': time.time()}, None,
+    )
+    return content
+
+
+def _refresh_later(ctype, cid):
+    """Refresh in the background unless another process already is."""
+    lock = 'livewhale_lock_{0}_{1}'.format(ctype, cid)
+    if cache.add(lock, 1, settings.LIVEWHALE_TIMEOUT[1] * 2):
+        _executor.submit(_refresh_and_unlock, ctype, cid, lock)
+
+
+def _refresh_and_unlock(ctype, cid, lock):
+    """Refresh and then release the lock."""
+    try:
+        refresh(ctype, cid)
+    finally:
+        cache.delete(lock)
+
+
+def get_content(ctype, cid, wait=False):
+    """Return cached content, refreshing it in the background if stale.
+
+    For a page, content that has never been fetched, or that the cache
+    evicted, is empty until the background fetch stores it, so a render
+    never waits on the API. An email is stored as rendered, so with wait
+    such content is fetched now, within LIVEWHALE_TIMEOUT.
+    """
+    entry = cache.get(_key(ctype, cid))
+    if entry is None:
+        _count('miss')
+        if wait:
+            return refresh(ctype, cid) or {}
+        _refresh_later(ctype, cid)
+        return {}
+    if time.time() - entry['fetched'] > settings.LIVEWHALE_CACHE_FRESH:
+        _count('stale')
+        _refresh_later(ctype, cid)
+    else:
+        _count('hit')
+    return entry['content']
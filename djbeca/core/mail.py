@@ -0,0 +1,68 @@
+# -*- coding: utf-8 -*-
+
+"""Outbound email through the outbox."""
+
+import datetime
+
+from django.apps import apps
+from django.conf import settings
+from django.core.mail import EmailMessage
+from django.template.loader import render_to_string
+
+
+def _addresses(recipients):
+    """Flatten nested lists of email addresses."""
+    addresses = []
+    for recipient in recipients or []:
+        if isinstance(recipient, (list, tuple)):
+            addresses.extend(_addresses(recipient))
+        elif recipient:
+            addresses.append(recipient)
+    return addresses
+
+
+def queue_mail(
+    request, recipients, subject, femail, template, data,
+    reply_to=None, bcc=None,
+):
+    """Render an email and add it to the outbox.
+
+    Takes the same arguments as djtools.utils.mail.send_mail. The message
+    is saved in the current transaction, so it is only sent if the
+    change that it announces is committed.
+    """
+    # the body is stored as rendered, so it must not miss API content
+    body = render_to_string(
+        template, {'data': data, 'livewhale_wait': True}, request=request,
+    )
+    return apps.get_model('core', 'OutboxMessage').objects.create(
+        subject=' '.join(subject.split()),
+        from_email=femail,
+        recipients=_addresses(recipients),
+        bcc=_addresses(bcc),
+        reply_to=_addresses(reply_to),
+        body=body,
+    )
+
+
+def outbox_email(message, connection):
+    """Build the EmailMessage for an OutboxMessage."""
+    email = EmailMessage(
+        message.subject,
+        message.body,
+        message.from_email,
+        message.recipients,
+        bcc=message.bcc,
+        reply_to=message.reply_to,
+        connection=connection,
+    )
+    email.content_subtype = 'html'
+    return email
+
+
+def retry_at(attempts):
+    """When to try again after a number of failed attempts."""
+    delay = settings.OUTBOX_RETRY_DELAY * 2 ** (attempts - 1)
+    return datetime.datetime.now() + datetime.timedelta(
+        seconds=min(delay, settings.OUTBOX_RETRY_MAX_DELAY),
+    )
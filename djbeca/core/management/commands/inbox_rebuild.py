@@ -0,0 +1,18 @@
+# -*- coding: utf-8 -*-
+
+"""Rebuild the pending actions inbox."""
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from djbeca.core.inbox import rebuild_pending_actions
+
+
+class Command(BaseCommand):
+    """Rebuild the pending actions of every open proposal."""
+
+    help = "Rebuild the pending actions inbox."
+
+    def handle(self, *args, **options):
+        """Rebuild in one transaction so the inbox is never half done."""
+        with transaction.atomic():
+            rebuild_pending_actions()
@@ -0,0 +1,44 @@
+# -*- coding: utf-8 -*-
+
+"""Copy the roles and groups that taggit tags hold into their columns."""
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from djbeca.core.contacts import CO_PRINCIPAL_ROLE
+from djbeca.core.contacts import CO_PRINCIPAL_TAG
+from djbeca.core.models import GenericChoice
+from djbeca.core.models import ProposalContact
+from djbeca.core.registry import clear_generic_choices
+
+
+# tag name, model, column, value
+ROLES = (
+    (CO_PRINCIPAL_TAG, ProposalContact, 'role', CO_PRINCIPAL_ROLE),
+    ('Subcontracts', GenericChoice, 'group', 'subcontracts'),
+)
+
+
+class Command(BaseCommand):
+    """Set ProposalContact.role and GenericChoice.group from their tags."""
+
+    help = "Copy the roles and groups that tags hold into their columns."
+
+    def handle(self, *args, **options):
+        """One UPDATE per role; the tags themselves are kept."""
+        with transaction.atomic():
+            for tag, model, column, value in ROLES:
+                # ids first: MySQL cannot update a table that it selects
+                # from in a subquery
+                ids = list(
+                    model.objects.filter(
+                        tags__name=tag,
+                    ).exclude(**{column: value}).values_list('id', flat=True),
+                )
+                count = model.objects.filter(pk__in=ids).update(
+                    **{column: value},
+                )
+                self.stdout.write('{0}: {1} {2} set to {3}'.format(
+                    model.__name__, count, column, value,
+                ))
+            # update() does not send the signal that does this
+            transaction.on_commit(clear_generic_choices)
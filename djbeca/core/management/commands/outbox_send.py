@@ -0,0 +1,94 @@
+# -*- coding: utf-8 -*-
+
+"""Send the email waiting in the outbox."""
+
+import datetime
+import logging
+import time
+
+from django.conf import settings
+from django.core.mail import get_connection
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from djbeca.core.mail import outbox_email
+from djbeca.core.mail import retry_at
+from djbeca.core.models import OutboxMessage
+from djbeca.core.utils import purge_idempotency_keys
+
+
+logger = logging.getLogger('debug_logfile')
+
+
+class Command(BaseCommand):
+    """Send due outbox messages in batches with retries and backoff."""
+
+    help = "Send the email waiting in the outbox."
+
+    def add_arguments(self, parser):
+        """Command line options."""
+        parser.add_argument(
+            '--loop',
+            action='store_true',
+            help="Keep running and poll the outbox.",
+        )
+        parser.add_argument(
+            '--sleep',
+            type=int,
+            default=10,
+            help="Seconds to wait between polls when looping.",
+        )
+
+    def handle(self, *args, **options):
+        """Drain the outbox once, or forever with --loop."""
+        while True:
+            sent = self.send_batch()
+            while sent == settings.OUTBOX_BATCH_SIZE:
+                sent = self.send_batch()
+            purge_idempotency_keys()
+            if not options['loop']:
+                break
+            time.sleep(options['sleep'])
+
+    def send_batch(self):
+        """Send one batch over a single mail connection."""
+        with transaction.atomic():
+            # skip rows that another worker has claimed
+            due = OutboxMessage.objects.select_for_update(
+                skip_locked=True,
+            ).filter(
+                sent_at__isnull=True,
+                next_attempt_at__lte=datetime.datetime.now(),
+                attempts__lt=settings.OUTBOX_MAX_ATTEMPTS,
+            ).order_by('next_attempt_at', 'id')
+            messages = list(due[:settings.OUTBOX_BATCH_SIZE])
+            if not messages:
+                return 0
+            connection = get_connection()
+            connection.open()
+            try:
+                for message in messages:
+                    error = None
+                    try:
+                        if not connection.send_messages(
+                            [outbox_email(message, connection)],
+                        ):
+                            error = 'The mail backend did not send it'
+                    except Exception as exception:
+                        error = str(exception)
+                    message.attempts += 1
+                    if error:
+                        message.last_error = error
+                        message.next_attempt_at = retry_at(message.attempts)
+                        logger.debug('outbox {0}: {1}'.format(
+                            message.id, error,
+                        ))
+                    else:
+                        message.sent_at = datetime.datetime.now()
+            finally:
+                connection.close()
+            OutboxMessage.objects.bulk_update(
+                messages,
+                ['attempts', 'last_error', 'next_attempt_at', 'sent_at'],
+            )
+        self.stdout.write('outbox: {0} processed'.format(len(messages)))
+        return len(messages)
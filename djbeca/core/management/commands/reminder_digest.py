@@ -0,0 +1,34 @@
+# -*- coding: utf-8 -*-
+
+"""Queue the daily reminder digests."""
+
+import datetime
+
+from django.core.management.base import BaseCommand
+from djbeca.core.reminders import queue_digests
+
+
+class Command(BaseCommand):
+    """Queue one digest per person of the actions due soon."""
+
+    help = "Queue the daily digests of pending actions due soon."
+
+    def add_arguments(self, parser):
+        """Command line options."""
+        parser.add_argument(
+            '--day',
+            type=datetime.date.fromisoformat,
+            default=None,
+            help="Day to send the digests for, as YYYY-MM-DD.",
+        )
+        parser.add_argument(
+            '--force',
+            action='store_true',
+            help="Queue the digests even if they were queued for the day.",
+        )
+
+    def handle(self, *args, **options):
+        """Queue the digests, which outbox_send then delivers."""
+        day = options['day'] or datetime.date.today()
+        count = queue_digests(day, force=options['force'])
+        self.stdout.write('{0} digests queued for {1}'.format(count, day))
@@ -0,0 +1,32 @@
+# -*- coding: utf-8 -*-
+
+"""Build the daily approval SLA rollup."""
+
+import datetime
+
+from django.core.management.base import BaseCommand
+from djbeca.core.analytics import build_rollups
+
+
+class Command(BaseCommand):
+    """Summarize the time in each approval stage for the SLA report."""
+
+    help = "Build the approval SLA rollup for a day, by default today."
+
+    def add_arguments(self, parser):
+        """Command line options."""
+        parser.add_argument(
+            '--day',
+            type=datetime.date.fromisoformat,
+            default=None,
+            help=(
+                "Day to build, as YYYY-MM-DD. A past day keeps the "
+                "waiting counts that it was built with."
+            ),
+        )
+
+    def handle(self, *args, **options):
+        """Build the rollup after the day's approvals are in."""
+        day = options['day'] or datetime.date.today()
+        count = build_rollups(day)
+        self.stdout.write('{0} rollup rows for {1}'.format(count, day))
@@ -0,0 +1,107 @@
+# -*- coding: utf-8 -*-
+
+"""Copy the Workday organisation hierarchy into local tables."""
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from djbeca.core.inbox import rebuild_pending_actions
+from djbeca.core.models import WorkdayDepartment
+from djbeca.core.models import WorkdayManager
+from djbeca.core.models import WorkdayPerson
+from djbeca.core.workday import clear_workday_cache
+from djbeca.core.workday import sync_person
+from djtools.utils import workday
+
+
+class Command(BaseCommand):
+    """Copy the Workday departments, deans, chairs and people."""
+
+    help = "Copy the Workday organisation hierarchy into local tables."
+
+    def add_arguments(self, parser):
+        """Command line options."""
+        parser.add_argument(
+            '--people',
+            action='store_true',
+            help="Refresh the departments of every user, not only new users.",
+        )
+
+    def handle(self, *args, **options):
+        """Sync departments and managers, then people."""
+        with transaction.atomic():
+            self.sync_departments()
+            self.sync_managers()
+        self.sync_people(options['people'])
+        clear_workday_cache()
+        # the deans in the inbox might have changed
+        with transaction.atomic():
+            rebuild_pending_actions()
+
+    def sync_departments(self):
+        """Create, update, and delete departments that changed."""
+        existing = WorkdayDepartment.objects.in_bulk()
+        live = {dept['id']: dept for dept in workday.department_all()}
+        create = []
+        update = []
+        for did, dept in live.items():
+            local = existing.get(did)
+            name = dept['name']
+            orbit = dept.get('orbit')
+            if not local:
+                create.append(
+                    WorkdayDepartment(id=did, name=name, orbit=orbit),
+                )
+            elif (local.name, local.orbit) != (name, orbit):
+                local.name = name
+                local.orbit = orbit
+                update.append(local)
+        WorkdayDepartment.objects.bulk_create(create)
+        WorkdayDepartment.objects.bulk_update(update, ['name', 'orbit'])
+        WorkdayDepartment.objects.exclude(pk__in=live.keys()).delete()
+        self.stdout.write('departments: {0} new, {1} updated'.format(
+            len(create), len(update),
+        ))
+
+    def sync_managers(self):
+        """Create and delete dean and chair assignments that changed."""
+        depts = set(WorkdayDepartment.objects.values_list('pk', flat=True))
+        live = set()
+        for mtype in ('deans', 'chairs'):
+            for man in workday.get_managers(mtype):
+                if mtype == 'chairs':
+                    # a chair sees only their own, first, department
+                    managed = (man.get('departments') or [])[:1]
+                else:
+                    managed = man.get('managed') or []
+                for dept in managed:
+                    # workday gives us the department URL, not the ID
+                    did = dept.split('/')[-2]
+                    if did in depts:
+                        live.add((did, mtype, int(man['id']), man['email']))
+        existing = {
+            (row.department_id, row.role, row.cid, row.email): row.pk
+            for row in WorkdayManager.objects.all()
+        }
+        WorkdayManager.objects.filter(
+            pk__in=[pk for key, pk in existing.items() if key not in live],
+        ).delete()
+        create = [
+            WorkdayManager(department_id=did, role=role, cid=cid, email=email)
+            for did, role, cid, email in live - existing.keys()
+        ]
+        WorkdayManager.objects.bulk_create(create)
+        self.stdout.write('managers: {0} new'.format(len(create)))
+
+    def sync_people(self, everyone):
+        """Copy the departments of new users, or of every user."""
+        cids = User.objects.values_list('id', flat=True)
+        if not everyone:
+            cids = cids.exclude(
+                id__in=WorkdayPerson.objects.values('cid'),
+            )
+        count = 0
+        for cid in cids.iterator():
+            sync_person(cid)
+            count += 1
+        self.stdout.write('people: {0} synced'.format(count))
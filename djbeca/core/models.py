@@ -2,19 +2,20 @@
 
 """Data models."""
 
+import datetime
 import logging
 
 from django.conf import settings
 from django.contrib.auth.models import User
 from django.core.validators import FileExtensionValidator
 from django.db import models
+from django.db.models.fields.files import FieldFile
 from django.urls import reverse
 from django.utils.safestring import mark_safe
 from djbeca.core import choices
+from djbeca.core.roles import get_roles
+from djbeca.core.workday import department_detail
 from djtools.fields.helpers import upload_to_path
-from djtools.utils.users import in_group
-from djtools.utils.workday import department_detail
-from djtools.utils.workday import get_managers
 from taggit.managers import TaggableManager
 
 
@@ -27,12 +28,80 @@ FILE_VALIDATORS = [
 
 def limit_subcontracts():
     """Return choices for m2m field in ProposalImpact data model."""
-    ids = [
-        choice.id for choice in GenericChoice.objects.filter(
-            tags__name__in=['Subcontracts'],
-        ).order_by('rank')
-    ]
-    return {'id__in': ids}
+    return {'group': 'subcontracts'}
+
+
+class DirtyFieldsMixin(object):
+    """Track changed fields so that save() writes only those columns.
+
+    A save() without update_fields writes the fields that changed since
+    the instance was loaded or last saved, plus its auto_now fields, and
+    does nothing at all, not even send signals, if none changed.
+    """
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        """Remember the values loaded from the database."""
+        instance = super().from_db(db, field_names, values)
+        instance._track()
+        return instance
+
+    def _values(self):
+        """Current values of the loaded concrete fields."""
+        values = {}
+        for field in self._meta.concrete_fields:
+            # deferred fields are not in __dict__ and must not be loaded
+            if field.primary_key or field.attname not in self.__dict__:
+                continue
+            value = self.__dict__[field.attname]
+            # a file can change in place, so compare by name
+            if isinstance(value, FieldFile):
+                value = value.name
+            values[field.attname] = value
+        return values
+
+    def _track(self, fields=None):
+        """Remember the current values of some fields, or of all of them."""
+        values = self._values()
+        if fields is None:
+            self._saved_values = values
+        else:
+            saved = self.__dict__.setdefault('_saved_values', {})
+            for field in fields:
+                name = self._meta.get_field(field).attname
+                if name in values:
+                    saved[name] = values[name]
+
+    def dirty_fields(self):
+        """Names of the fields that changed since the last load or save."""
+        saved = self.__dict__.get('_saved_values', {})
+        values = self._values()
+        return [
+            field.name for field in self._meta.concrete_fields
+            if field.attname in values and (
+                field.attname not in saved or
+                saved[field.attname] != values[field.attname]
+            )
+        ]
+
+    def save(self, *args, **kwargs):
+        """Write only the changed fields of an existing row."""
+        tracked = '_saved_values' in self.__dict__
+        if tracked and not self._state.adding and (
+            kwargs.get('update_fields') is None and not kwargs.get(
+                'force_insert',
+            )
+        ):
+            dirty = self.dirty_fields()
+            if not dirty:
+                return
+            kwargs['update_fields'] = dirty + [
+                field.name for field in self._meta.concrete_fields
+                if getattr(field, 'auto_now', False) and
+                field.name not in dirty
+            ]
+        super().save(*args, **kwargs)
+        self._track(kwargs.get('update_fields'))
 
 
 class GenericChoice(models.Model):
@@ -57,24 +126,107 @@ class GenericChoice(models.Model):
     admin = models.BooleanField(
         verbose_name="Administrative only", default=False,
     )
+    # the form field that offers this choice. tags remain for ad-hoc use.
+    group = models.CharField(
+        max_length=32,
+        choices=choices.GENERIC_CHOICE_GROUP_CHOICES,
+        null=True,
+        blank=True,
+    )
     tags = TaggableManager(blank=True)
 
     class Meta:
         """Attributes about the data model and admin options."""
 
         ordering = ['rank']
+        indexes = [
+            models.Index(
+                fields=['group', 'active', 'rank'],
+                name='generic_choice_group_idx',
+            ),
+        ]
 
     def __str__(self):
         """Default data for display."""
         return self.name
 
 
-class Proposal(models.Model):
+class ProposalQuerySet(models.QuerySet):
+    """Custom queries for the Proposal data model."""
+
+    def dashboard(self):
+        """Fetch the relationships that list views display for each row."""
+        return self.select_related('user', 'impact').prefetch_related(
+            models.Prefetch(
+                'approvers',
+                queryset=ProposalApprover.objects.select_related('user'),
+            ),
+        )
+
+    def with_stage(self):
+        """Annotate the workflow stage so that it can be filtered on.
+
+        The annotations compute in the database what Proposal.step2() and
+        Proposal.ready_level1() compute in Python:
+
+        awaiting_level3: Part A is open and the Division Dean has not
+        approved it.
+        ready_for_level1: the Division Dean and every approver approved
+        Part B, so the VP for Business and the Provost can authorize it.
+        step2_complete: everyone approved Part B.
+        """
+        pending_approver = ProposalApprover.objects.filter(
+            proposal=models.OuterRef('pk'), step2=False,
+        )
+        impact = ProposalImpact.objects.filter(
+            proposal=models.OuterRef('pk'), level3=True,
+        )
+        return self.annotate(
+            awaiting_level3=models.ExpressionWrapper(
+                models.Q(level3=False, decline=False, closed=False),
+                output_field=models.BooleanField(),
+            ),
+            ready_for_level1=models.ExpressionWrapper(
+                models.Exists(impact) & ~models.Exists(pending_approver),
+                output_field=models.BooleanField(),
+            ),
+            step2_complete=models.ExpressionWrapper(
+                models.Exists(impact.filter(level2=True, level1=True)) &
+                ~models.Exists(pending_approver),
+                output_field=models.BooleanField(),
+            ),
+        )
+
+    def stage_counts(self):
+        """Count the open proposals in each OSP work queue in one query.
+
+        The keys are the dashboard status filters of the queues.
+        """
+        open_work = models.Q(decline=False, closed=False)
+        return self.with_stage().aggregate(
+            level3=models.Count('pk', filter=open_work & models.Q(
+                awaiting_level3=True,
+            )),
+            impact=models.Count('pk', filter=open_work & models.Q(
+                level3=True, save_submit=False,
+            )),
+            level1=models.Count('pk', filter=open_work & models.Q(
+                ready_for_level1=True, step2_complete=False,
+            )),
+            approved=models.Count('pk', filter=open_work & models.Q(
+                step2_complete=True,
+            )),
+        )
+
+
+class Proposal(DirtyFieldsMixin, models.Model):
     """Proposal to pursue funding."""
 
     # meta
     created_at = models.DateTimeField('Date Created', auto_now_add=True)
     updated_at = models.DateTimeField('Date Updated', auto_now=True)
+    # incremented by every form edit, for optimistic concurrency
+    version = models.PositiveIntegerField(default=0, editable=False)
     user = models.ForeignKey(
         User,
         on_delete=models.CASCADE,
@@ -237,12 +389,39 @@ class Proposal(models.Model):
         """,
     )
 
+    objects = ProposalQuerySet.as_manager()
+
     class Meta:
         """Attributes about the data model and admin options."""
 
         ordering = ['-created_at']
         get_latest_by = 'created_at'
         db_table = 'core_proposal'
+        indexes = [
+            # dashboard order and keyset paging
+            models.Index(
+                fields=['-grant_deadline_date', '-id'],
+                name='proposal_deadline_idx',
+            ),
+            # dean and chair department dashboards
+            models.Index(
+                fields=['department', '-grant_deadline_date'],
+                name='proposal_dept_deadline_idx',
+            ),
+            # principal investigator dashboards
+            models.Index(
+                fields=['user', '-grant_deadline_date'],
+                name='proposal_user_deadline_idx',
+            ),
+            # OSP dashboard date range
+            models.Index(fields=['created_at'], name='proposal_created_idx'),
+            # open work: neither closed nor declined. a plain index, since
+            # MySQL does not support partial ones
+            models.Index(
+                fields=['closed', 'decline', 'grant_deadline_date'],
+                name='proposal_open_idx',
+            ),
+        ]
 
     def __unicode__(self):
         """Default data for display."""
@@ -270,10 +449,33 @@ class Proposal(models.Model):
         """Returns the proposal slug."""
         return 'proposal/'
 
-    def permissions(self, user):
-        """What can the user access in terms of viewing & approval process."""
-        veep = User.objects.filter(groups__name=settings.CFO_GROUP)[0]
-        provost = User.objects.filter(groups__name=settings.PROVOST_GROUP)[0]
+    def get_approver(self, user, approvers=None):
+        """Return the ProposalApprover for the user or None."""
+        if approvers is not None:
+            return approvers.get(self.id)
+        # use the approvers if the queryset prefetched them
+        if 'approvers' in getattr(self, '_prefetched_objects_cache', {}):
+            for approver in self.approvers.all():
+                if approver.user_id == user.id:
+                    return approver
+            return None
+        return self.approvers.filter(user=user).first()
+
+    def has_impact(self, impacts=None):
+        """Check if Part B has been started."""
+        if impacts is not None:
+            return self.id in impacts
+        return hasattr(self, 'impact')
+
+    def permissions(self, user, approvers=None, impacts=None):
+        """What can the user access in terms of viewing & approval process.
+
+        approvers, a dictionary of the user's ProposalApprover objects by
+        proposal ID, and impacts, a set of the IDs of proposals that have
+        a ProposalImpact, let permissions_for() evaluate many proposals
+        without querying for each one.
+        """
+        roles = get_roles(user)
 
         perms = {
             'view': False,
@@ -289,12 +491,8 @@ class Proposal(models.Model):
             'level1': False,
         }
 
-        # in_group includes an exception for superusers
-        group = in_group(user, settings.OSP_GROUP)
-        dean = get_managers('deans', cid=user.id)
-        chair = get_managers('chairs', cid=user.id)
         # Dean
-        if dean:
+        if roles['dean']:
             perms['view'] = True
             perms['level3'] = True
             perms['open'] = True
@@ -302,28 +500,27 @@ class Proposal(models.Model):
             perms['decline'] = True
             perms['approve'] = 'level3'
         # chair
-        elif chair:
+        elif roles['chair']:
             perms['view'] = True
         # VP for Business
-        elif user.id == veep.id:
+        elif roles['cfo']:
             perms['view'] = True
             perms['level2'] = True
             perms['needswork'] = True
             perms['decline'] = True
             perms['approve'] = 'level2'
         # Provost
-        elif user.id == provost.id:
+        elif roles['provost']:
             perms['view'] = True
             perms['level1'] = True
             perms['needswork'] = True
             perms['decline'] = True
             perms['approve'] = 'level1'
             # provost might be an adhoc approver
-            for approver in self.approvers.all():
-                if approver.user == user:
-                    perms['approver'] = True
+            if self.get_approver(user, approvers):
+                perms['approver'] = True
         # Superuser
-        elif group:
+        elif roles['osp']:
             perms['view'] = True
             perms['open'] = True
             perms['close'] = True
@@ -334,33 +531,31 @@ class Proposal(models.Model):
             perms['needswork'] = True
             perms['decline'] = True
             perms['approve'] = 'superuser'
-        elif self.user == user:
+        elif self.user_id == user.id:
             perms['view'] = True
             perms['open'] = True
         # Ad-hoc approver?
         else:
-            step2 = hasattr(self, 'impact')
-            for approver in self.approvers.all():
-                if approver.user == user:
-                    perms['view'] = True
-                    if step2 and self.level3:
-                        if approver.steps == '2' or approver.steps == '3':
-                            if not approver.step2:
-                                perms['approver'] = True
-                                perms['approve'] = 'approver'
-                                # right now, approvers can only replace level3
-                                perms['level3'] = True
-                                perms['needswork'] = True
-                                perms['decline'] = True
-                    else:
-                        if approver.steps == '1' or approver.steps == '3':
+            approver = self.get_approver(user, approvers)
+            if approver:
+                perms['view'] = True
+                if self.level3 and self.has_impact(impacts):
+                    if approver.steps == '2' or approver.steps == '3':
+                        if not approver.step2:
                             perms['approver'] = True
                             perms['approve'] = 'approver'
                             # right now, approvers can only replace level3
                             perms['level3'] = True
                             perms['needswork'] = True
                             perms['decline'] = True
-                    break
+                else:
+                    if approver.steps == '1' or approver.steps == '3':
+                        perms['approver'] = True
+                        perms['approve'] = 'approver'
+                        # right now, approvers can only replace level3
+                        perms['level3'] = True
+                        perms['needswork'] = True
+                        perms['decline'] = True
 
         return perms
 
@@ -409,12 +604,14 @@ class Proposal(models.Model):
         return approved
 
 
-class ProposalImpact(models.Model):
+class ProposalImpact(DirtyFieldsMixin, models.Model):
     """Proposal impact data."""
 
     # meta
     created_at = models.DateTimeField("Date Created", auto_now_add=True)
     updated_at = models.DateTimeField("Date Updated", auto_now=True)
+    # incremented by every form edit, for optimistic concurrency
+    version = models.PositiveIntegerField(default=0, editable=False)
     proposal = models.OneToOneField(
         Proposal,
         related_name='impact',
@@ -683,7 +880,7 @@ class ProposalImpact(models.Model):
         return 'proposal-impact/'
 
 
-class ProposalBudget(models.Model):
+class ProposalBudget(DirtyFieldsMixin, models.Model):
     """Proposal budget data."""
 
     # meta
@@ -693,6 +890,8 @@ class ProposalBudget(models.Model):
     updated_at = models.DateTimeField(
         'Date Updated', auto_now=True,
     )
+    # incremented by every form edit, for optimistic concurrency
+    version = models.PositiveIntegerField(default=0, editable=False)
     proposal = models.OneToOneField(
         Proposal,
         editable=False,
@@ -886,6 +1085,13 @@ class ProposalContact(models.Model):
         null=True,
         blank=True,
     )
+    # tags remain for ad-hoc use
+    role = models.CharField(
+        max_length=32,
+        choices=choices.CONTACT_ROLE_CHOICES,
+        null=True,
+        blank=True,
+    )
     tags = TaggableManager(blank=True)
 
     class Meta:
@@ -894,6 +1100,12 @@ class ProposalContact(models.Model):
         ordering = ['created_at']
         get_latest_by = 'created_at'
         db_table = 'core_proposal_contact'
+        indexes = [
+            # the contacts in a role on a proposal
+            models.Index(
+                fields=['proposal', 'role'], name='contact_proposal_role_idx',
+            ),
+        ]
 
     def get_slug(self):
         """Build the URL slug."""
@@ -904,18 +1116,21 @@ class ProposalContact(models.Model):
         return "{0}: {1}".format(self.name, self.institution)
 
 
-class ProposalApprover(models.Model):
+class ProposalApprover(DirtyFieldsMixin, models.Model):
     """Additional folks who need to approve a proposal."""
 
+    # the composite indexes below lead with these columns
     user = models.ForeignKey(
         User,
         related_name='approver_user',
         on_delete=models.CASCADE,
+        db_index=False,
     )
     proposal = models.ForeignKey(
         Proposal,
         related_name='approvers',
         on_delete=models.CASCADE,
+        db_index=False,
     )
     # this field is not in use at the moment but i suspect
     # OSP will want to reactivate it in the future
@@ -938,6 +1153,16 @@ class ProposalApprover(models.Model):
         """Attributes about the data model and admin options."""
 
         db_table = 'core_proposal_approver'
+        indexes = [
+            # proposals for which a user is an approver
+            models.Index(
+                fields=['user', 'proposal'], name='approver_user_proposal_idx',
+            ),
+            # approver for a user on a proposal
+            models.Index(
+                fields=['proposal', 'user'], name='approver_proposal_user_idx',
+            ),
+        ]
 
     def first_name(self):
         """Return the approver's first name."""
@@ -954,3 +1179,314 @@ class ProposalApprover(models.Model):
     def title(self):
         """Return the proposal title."""
         return self.proposal.title
+
+
+class WorkdayDepartment(models.Model):
+    """Local copy of a Workday department."""
+
+    id = models.CharField(primary_key=True, max_length=12)
+    name = models.CharField(max_length=255)
+    orbit = models.CharField(max_length=24, null=True, blank=True)
+    synced_at = models.DateTimeField("Date Synced", auto_now=True)
+
+    class Meta:
+        """Attributes about the data model and admin options."""
+
+        ordering = ['name']
+        db_table = 'core_workday_department'
+
+    def __str__(self):
+        """Default data for display."""
+        return self.name
+
+
+class WorkdayManager(models.Model):
+    """Local copy of a Workday dean or chair of a department."""
+
+    department = models.ForeignKey(
+        WorkdayDepartment,
+        related_name='managers',
+        on_delete=models.CASCADE,
+    )
+    # Workday ID, which is also the User ID
+    cid = models.IntegerField()
+    email = models.CharField(max_length=128)
+    role = models.CharField(
+        max_length=8, choices=choices.WORKDAY_MANAGER_CHOICES,
+    )
+
+    class Meta:
+        """Attributes about the data model and admin options."""
+
+        db_table = 'core_workday_manager'
+        indexes = [
+            models.Index(
+                fields=['role', 'cid'], name='workday_manager_role_cid_idx',
+            ),
+            models.Index(
+                fields=['department', 'role'], name='workday_manager_dept_idx',
+            ),
+        ]
+
+    def __str__(self):
+        """Default data for display."""
+        return '{0}: {1}'.format(self.role, self.email)
+
+
+class WorkdayPerson(models.Model):
+    """Local copy of a department to which a Workday person belongs."""
+
+    # Workday ID, which is also the User ID
+    cid = models.IntegerField()
+    department = models.ForeignKey(
+        WorkdayDepartment,
+        related_name='people',
+        on_delete=models.CASCADE,
+    )
+    synced_at = models.DateTimeField("Date Synced", auto_now=True)
+
+    class Meta:
+        """Attributes about the data model and admin options."""
+
+        db_table = 'core_workday_person'
+        indexes = [
+            models.Index(
+                fields=['cid', 'department'], name='workday_person_cid_idx',
+            ),
+        ]
+
+
+class OutboxMessage(models.Model):
+    """Email that the outbox_send command will deliver."""
+
+    created_at = models.DateTimeField("Date Created", auto_now_add=True)
+    sent_at = models.DateTimeField("Date Sent", null=True, blank=True)
+    next_attempt_at = models.DateTimeField(
+        "Next Attempt", default=datetime.datetime.now,
+    )
+    attempts = models.PositiveIntegerField(default=0)
+    last_error = models.TextField(null=True, blank=True)
+    subject = models.TextField()
+    from_email = models.CharField(max_length=255)
+    recipients = models.JSONField(default=list)
+    bcc = models.JSONField(default=list)
+    reply_to = models.JSONField(default=list)
+    body = models.TextField()
+
+    class Meta:
+        """Attributes about the data model and admin options."""
+
+        ordering = ['created_at']
+        db_table = 'core_outbox_message'
+        indexes = [
+            # unsent messages that are due
+            models.Index(
+                fields=['sent_at', 'next_attempt_at'], name='outbox_due_idx',
+            ),
+        ]
+
+    def __str__(self):
+        """Default data for display."""
+        return self.subject
+
+
+class PendingAction(models.Model):
+    """An action that a user has to take on a proposal.
+
+    The rows are maintained by signals on every workflow transition so
+    that the inbox does not evaluate the permissions of each proposal.
+    """
+
+    created_at = models.DateTimeField("Date Created", auto_now_add=True)
+    user = models.ForeignKey(
+        User,
+        related_name='pending_actions',
+        on_delete=models.CASCADE,
+    )
+    proposal = models.ForeignKey(
+        Proposal,
+        related_name='pending_actions',
+        on_delete=models.CASCADE,
+    )
+    action = models.CharField(
+        max_length=16, choices=choices.PENDING_ACTION_CHOICES,
+    )
+
+    class Meta:
+        """Attributes about the data model and admin options."""
+
+        ordering = ['created_at']
+        db_table = 'core_pending_action'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'proposal', 'action'],
+                name='pending_action_unique',
+            ),
+        ]
+        indexes = [
+            # the inbox of a user, oldest first
+            models.Index(
+                fields=['user', 'created_at'], name='pending_user_created_idx',
+            ),
+        ]
+
+    def __str__(self):
+        """Default data for display."""
+        return '{0}: {1}'.format(self.get_action_display(), self.proposal_id)
+
+
+class IdempotencyKey(models.Model):
+    """A proposal status request that has been applied.
+
+    A request that is repeated with the same key, like a double click or
+    a retry after a timeout, gets the stored response instead of being
+    applied again.
+    """
+
+    created_at = models.DateTimeField("Date Created", auto_now_add=True)
+    user = models.ForeignKey(
+        User,
+        related_name='idempotency_keys',
+        on_delete=models.CASCADE,
+    )
+    key = models.CharField(max_length=64)
+    response = models.TextField()
+
+    class Meta:
+        """Attributes about the data model and admin options."""
+
+        db_table = 'core_idempotency_key'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'key'], name='idempotency_user_key_unique',
+            ),
+        ]
+        indexes = [
+            # the purge of expired keys
+            models.Index(
+                fields=['created_at'], name='idempotency_created_idx',
+            ),
+        ]
+
+    def __str__(self):
+        """Default data for display."""
+        return self.key
+
+
+class ProposalEvent(models.Model):
+    """A workflow transition of a proposal.
+
+    The workflow flags on the proposal are overwritten by each step, so
+    these rows, which are only ever inserted, are its history.
+    """
+
+    created_at = models.DateTimeField("Date Created", auto_now_add=True)
+    proposal = models.ForeignKey(
+        Proposal,
+        related_name='events',
+        on_delete=models.CASCADE,
+    )
+    actor = models.ForeignKey(
+        User,
+        related_name='proposal_events',
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+    )
+    event = models.PositiveSmallIntegerField(
+        choices=choices.PROPOSAL_EVENT_CHOICES,
+    )
+
+    class Meta:
+        """Attributes about the data model and admin options."""
+
+        ordering = ['created_at', 'id']
+        db_table = 'core_proposal_event'
+        indexes = [
+            # the timeline of a proposal
+            models.Index(
+                fields=['proposal', 'created_at'],
+                name='event_proposal_created_idx',
+            ),
+            # the activity of a user
+            models.Index(
+                fields=['actor', 'created_at'], name='event_actor_created_idx',
+            ),
+        ]
+
+    def __str__(self):
+        """Default data for display."""
+        return '{0}: {1}'.format(self.get_event_display(), self.proposal_id)
+
+    def save(self, *args, **kwargs):
+        """Refuse to change an event that has been recorded."""
+        if not self._state.adding:
+            raise ValueError('Proposal events cannot be changed.')
+        super(ProposalEvent, self).save(*args, **kwargs)
+
+
+class DigestRun(models.Model):
+    """A day for which the reminder digests have been queued.
+
+    The unique day is inserted in the transaction that queues the
+    digests, so two runs for the same day cannot both queue them.
+    """
+
+    created_at = models.DateTimeField("Date Created", auto_now_add=True)
+    day = models.DateField(unique=True)
+    # digests queued
+    count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        """Attributes about the data model and admin options."""
+
+        db_table = 'core_digest_run'
+
+    def __str__(self):
+        """Default data for display."""
+        return str(self.day)
+
+
+class StageRollup(models.Model):
+    """Daily summary of the time that proposals wait in an approval stage.
+
+    Each day has a row per stage for all proposals, and one per stage
+    for each department and for each approver, with neither set on the
+    rows for all proposals. The rows are built by the sla_rollup command
+    from the proposal events, so the report reads them without any work.
+    """
+
+    day = models.DateField()
+    stage = models.CharField(max_length=8, choices=choices.SLA_STAGE_CHOICES)
+    department = models.CharField(max_length=12, blank=True, default='')
+    approver = models.ForeignKey(
+        User,
+        related_name='stage_rollups',
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+    )
+    # approvals completed during the window that ends on the day
+    completed = models.PositiveIntegerField(default=0)
+    # hours from the start of the stage to the approval
+    p50_hours = models.FloatField(null=True, blank=True)
+    p90_hours = models.FloatField(null=True, blank=True)
+    max_hours = models.FloatField(null=True, blank=True)
+    # approvals completed after the proposal deadline
+    late = models.PositiveIntegerField(default=0)
+    # approvals still waiting on the day, and those past the deadline
+    pending = models.PositiveIntegerField(default=0)
+    overdue = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        """Attributes about the data model and admin options."""
+
+        db_table = 'core_stage_rollup'
+        indexes = [
+            # the report for a day
+            models.Index(fields=['day', 'stage'], name='rollup_day_stage_idx'),
+        ]
+
+    def __str__(self):
+        """Default data for display."""
+        return '{0}: {1}'.format(self.day, self.get_stage_display())
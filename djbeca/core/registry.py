@@ -0,0 +1,49 @@
+# -*- coding: utf-8 -*-
+
+"""In-process registry of the active GenericChoice rows by group.
+
+Each worker process loads the choices once and keeps them until the
+shared version key in the cache changes, which a GenericChoice save or
+delete in any process does. Reading choices is then one cache read and
+no queries.
+"""
+
+import threading
+
+from django.apps import apps
+from django.core.cache import cache
+
+
+VERSION_KEY = 'generic_choice_version'
+_registry = {'version': None, 'groups': {}}
+_lock = threading.Lock()
+
+
+def _load():
+    """Group the active choices by their group, ordered by rank."""
+    groups = {}
+    rows = apps.get_model('core', 'GenericChoice').objects.filter(
+        active=True, group__isnull=False,
+    ).order_by('rank', 'id').values_list('group', 'id', 'name')
+    for group, cid, name in rows:
+        groups.setdefault(group, []).append((cid, name))
+    return {group: tuple(pairs) for group, pairs in groups.items()}
+
+
+def generic_choices(group):
+    """Return the (id, name) choices of a group for a form field."""
+    version = cache.get_or_set(VERSION_KEY, 1, None)
+    if _registry['version'] != version:
+        with _lock:
+            if _registry['version'] != version:
+                _registry['groups'] = _load()
+                _registry['version'] = version
+    return _registry['groups'].get(group, ())
+
+
+def clear_generic_choices():
+    """Make every process reload the choices on next use."""
+    try:
+        cache.incr(VERSION_KEY)
+    except ValueError:
+        cache.set(VERSION_KEY, 1, None)
@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+
+"""Daily digest of the pending actions on proposals that are due soon."""
+
+import datetime
+from itertools import groupby
+
+from django.conf import settings
+from django.db import IntegrityError
+from django.db import transaction
+from djbeca.core.mail import queue_mail
+from djbeca.core.models import DigestRun
+from djbeca.core.models import PendingAction
+
+
+def due_actions(day):
+    """Pending actions on open proposals due within REMINDER_DAYS of day.
+
+    One query over the deadline range, ordered by recipient so that the
+    actions can be grouped into one digest per person.
+    """
+    return PendingAction.objects.filter(
+        proposal__closed=False,
+        proposal__decline=False,
+        proposal__grant_deadline_date__range=(
+            day, day + datetime.timedelta(days=settings.REMINDER_DAYS),
+        ),
+    ).select_related('user', 'proposal').order_by(
+        'user_id', 'proposal__grant_deadline_date', 'proposal_id',
+    )
+
+
+@transaction.atomic
+def queue_digests(day, force=False):
+    """Add one digest per recipient to the outbox and return the count.
+
+    The outbox_send command delivers them over a single connection per
+    batch, so the mail sent grows with the number of recipients rather
+    than with the number of proposals. The digests of a day are queued
+    once unless force is set.
+    """
+    if force:
+        DigestRun.objects.filter(day=day).delete()
+    # claim the day first: a concurrent run waits on the unique key and
+    # then fails, and a run that fails releases the day with its rollback
+    try:
+        with transaction.atomic():
+            run = DigestRun.objects.create(day=day)
+    except IntegrityError:
+        return 0
+    frum = settings.PROPOSAL_EMAIL_LIST[0]
+    count = 0
+    for user, actions in groupby(
+        due_actions(day).iterator(), key=lambda action: action.user,
+    ):
+        if not user.email:
+            continue
+        actions = list(actions)
+        data = {'user': user, 'actions': actions}
+        to_list = [user.email]
+        if settings.DEBUG:
+            data['to_list'] = to_list
+            to_list = [settings.MANAGERS[0][1], frum]
+        queue_mail(
+            None,
+            to_list,
+            'Proposals awaiting your action: {0} due by {1}'.format(
+                len(actions),
+                actions[-1].proposal.grant_deadline_date.strftime('%Y-%m-%d'),
+            ),
+            frum,
+            'reminder/email_digest.html',
+            data,
+            reply_to=[frum],
+        )
+        count += 1
+    run.count = count
+    run.save(update_fields=['count'])
+    return count
@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+
+"""Resolved workflow roles for a user."""
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from djbeca.core.workday import get_managers
+from djbeca.core.workday import workday_version
+
+
+VERSION_KEY = 'roles_version'
+
+
+def _key(uid):
+    """Cache key for the roles of a user."""
+    return 'roles_{0}_{1}_{2}'.format(
+        uid, cache.get_or_set(VERSION_KEY, 1, None), workday_version(),
+    )
+
+
+def _resolve(user):
+    """Look up the groups and Workday management roles of a user."""
+    groups = set(user.groups.values_list('name', flat=True))
+    dean = get_managers('deans', cid=user.id)
+    chair = get_managers('chairs', cid=user.id)
+    # only the user who holds the office, not every member of its group
+    cfo = get_group_user(settings.CFO_GROUP)
+    provost = get_group_user(settings.PROVOST_GROUP)
+    return {
+        # like in_group, OSP includes superusers
+        'osp': user.is_superuser or settings.OSP_GROUP in groups,
+        'dean': dean['managed'] if dean else [],
+        'chair': chair['managed'] if chair else [],
+        'cfo': cfo is not None and cfo.id == user.id,
+        'provost': provost is not None and provost.id == user.id,
+        'president': settings.PRESIDENT_GROUP in groups,
+    }
+
+
+def get_roles(user):
+    """Return the roles of a user.
+
+    The roles are a dictionary with the boolean 'osp', 'cfo', 'provost',
+    and 'president' keys, and the 'dean' and 'chair' lists of the IDs of
+    the departments that the user manages.
+    """
+    roles = getattr(user, '_djbeca_roles', None)
+    if roles is None:
+        key = _key(user.id)
+        roles = cache.get(key)
+        if roles is None:
+            roles = _resolve(user)
+            cache.set(key, roles, settings.ROLES_CACHE_TIMEOUT)
+        # keep them on the user object for the rest of the request
+        user._djbeca_roles = roles
+    return roles
+
+
+def get_group_user(group):
+    """Return the user who holds a one-person role, like the Provost.
+
+    Nothing is looked up until the first call, and the user is cached
+    until group membership changes.
+    """
+    key = 'role_user_{0}_{1}'.format(
+        group.replace(' ', '_'), cache.get_or_set(VERSION_KEY, 1, None),
+    )
+    # wrap the value so that an empty group is still a cache hit
+    cached = cache.get(key)
+    if cached is None:
+        cached = (User.objects.filter(groups__name=group).first(),)
+        cache.set(key, cached, settings.ROLES_CACHE_TIMEOUT)
+    return cached[0]
+
+
+def clear_roles_cache(user=None):
+    """Invalidate the cached roles of one user, or of everyone."""
+    if user is not None:
+        cache.delete(_key(user.id))
+        return
+    try:
+        cache.incr(VERSION_KEY)
+    except ValueError:
+        cache.set(VERSION_KEY, 1, None)
@@ -3,22 +3,75 @@
 """Signals for various events."""
 
 from django.conf import settings
+from django.contrib.auth.models import Group
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models.signals import m2m_changed
+from django.db.models.signals import post_delete
 from django.db.models.signals import post_save
+from django.db.models.signals import pre_save
 from django.dispatch import receiver
+from djbeca.core.dashboard import expire_all_dashboards
+from djbeca.core.dashboard import department_viewers
+from djbeca.core.dashboard import expire_dashboards
+from djbeca.core.dashboard import proposal_viewers
+from djbeca.core.inbox import rebuild_officer_actions
+from djbeca.core.inbox import sync_pending_actions
+from djbeca.core.mail import queue_mail
+from djbeca.core.models import GenericChoice
+from djbeca.core.models import Proposal
+from djbeca.core.models import ProposalApprover
 from djbeca.core.models import ProposalImpact
-from djtools.utils.mail import send_mail
+from djbeca.core.registry import clear_generic_choices
+from djbeca.core.roles import clear_roles_cache
+from djbeca.core.utils import guarded_update
 
 
+# fields that the workflow receivers depend on
+IMPACT_APPROVAL_FIELDS = frozenset(['level1', 'level2', 'level3'])
+WORKFLOW_FIELDS = {
+    Proposal: frozenset([
+        'user', 'department', 'level3', 'decline', 'closed', 'save_submit',
+    ]),
+    ProposalImpact: IMPACT_APPROVAL_FIELDS,
+    ProposalApprover: frozenset(['user', 'steps', 'step1', 'step2']),
+}
+# one-person groups whose holder the inbox rows name
+OFFICER_GROUPS = frozenset([settings.CFO_GROUP, settings.PROVOST_GROUP])
+
 # If an approver has not approved the proposal before the
 # level1, level2, and level3 folks have done so, no email
 # is sent. we should create a new signal receiver for
 # ProposalApprover
 
 
+def _changed(kwargs, fields):
+    """Whether a save might have changed any of the fields."""
+    update_fields = kwargs.get('update_fields')
+    return update_fields is None or bool(fields & update_fields)
+
+
 @receiver(post_save, sender=ProposalImpact)
 def proposal_impact_post_save_notify_osp(sender, **kwargs):
     """Send an email to the OSP when all approvals have been met."""
-    proposal = kwargs['instance'].proposal
+    impact = kwargs['instance']
+    # nothing to do unless an approval flag was set
+    if not _changed(kwargs, IMPACT_APPROVAL_FIELDS):
+        return
+    if not (impact.level1 and impact.level2 and impact.level3):
+        return
+    pid = impact.proposal_id
+    transaction.on_commit(lambda: notify_osp_final_approval(pid))
+
+
+@transaction.atomic
+def notify_osp_final_approval(pid):
+    """Email the OSP if the proposal has every approval."""
+    proposal = Proposal.objects.select_related('user', 'impact').filter(
+        pk=pid,
+    ).first()
+    if proposal is None:
+        return
 
     status = (
         not proposal.decline and
@@ -26,7 +79,11 @@ def proposal_impact_post_save_notify_osp(sender, **kwargs):
         proposal.step2() and
         not proposal.email_approved
     )
-    if status:
+    # only the request that flips email_approved sends the email, so two
+    # approvals at the same time do not both send it
+    if status and guarded_update(
+        proposal, {'email_approved': False}, email_approved=True,
+    ):
         to_list = settings.PROPOSAL_EMAIL_LIST
         bcc = [settings.MANAGERS[0][1]]
         if settings.DEBUG:
@@ -37,8 +94,8 @@ def proposal_impact_post_save_notify_osp(sender, **kwargs):
             proposal.title, proposal.user.last_name, proposal.user.first_name,
         )
         frum = settings.SERVER_MAIL
-        sent = send_mail(
-            kwargs.get('request'),
+        queue_mail(
+            None,
             recipients=to_list,
             subject=subject,
             femail=frum,
@@ -47,6 +104,167 @@ def proposal_impact_post_save_notify_osp(sender, **kwargs):
             reply_to=settings.PROPOSAL_EMAIL_LIST,
             bcc=bcc,
         )
-        if sent:
-            proposal.email_approved = True
-            proposal.save()
+
+
+def _officers_changed(kwargs):
+    """Whether a group membership change involves an officer group."""
+    if kwargs['reverse']:
+        # group.user_set changed
+        return kwargs['instance'].name in OFFICER_GROUPS
+    # user.groups changed, or was cleared
+    if kwargs['pk_set'] is None:
+        return True
+    return Group.objects.filter(
+        pk__in=kwargs['pk_set'], name__in=OFFICER_GROUPS,
+    ).exists()
+
+
+def _rebuild_officer_actions():
+    """Point the inbox rows at the new VP for Business or Provost."""
+    # another request may have cached the old holder before the commit
+    clear_roles_cache()
+    rebuild_officer_actions()
+
+
+@receiver(m2m_changed, sender=User.groups.through)
+def user_groups_clear_roles(sender, **kwargs):
+    """Group membership changed so the cached roles are stale."""
+    if kwargs['action'].startswith('post_'):
+        clear_roles_cache()
+        if _officers_changed(kwargs):
+            transaction.on_commit(_rebuild_officer_actions)
+
+
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def group_clear_roles(sender, **kwargs):
+    """A group was renamed or deleted so the cached roles are stale."""
+    clear_roles_cache()
+
+
+@receiver(pre_save, sender=User)
+def user_note_name_change(sender, **kwargs):
+    """Note whether the name that the dashboards show is changing."""
+    user = kwargs['instance']
+    # a new user is on no dashboard, and signing in changes no name
+    if user.pk is None or kwargs.get('update_fields') == frozenset(
+        ['last_login'],
+    ):
+        return
+    saved = User.objects.filter(pk=user.pk).values_list(
+        'first_name', 'last_name',
+    ).first()
+    user._djbeca_renamed = saved != (user.first_name, user.last_name)
+
+
+@receiver(post_save, sender=User)
+def user_clear_roles(sender, **kwargs):
+    """Superuser status might have changed."""
+    # signing in only updates last_login
+    if kwargs.get('update_fields') != frozenset(['last_login']):
+        clear_roles_cache(kwargs['instance'])
+        uid = kwargs['instance'].id
+        transaction.on_commit(lambda: expire_dashboards([uid]))
+        # the user's name is on the dashboards of others too
+        if kwargs['instance'].__dict__.pop('_djbeca_renamed', False):
+            transaction.on_commit(expire_all_dashboards)
+
+
+def _expire_on_commit(uids):
+    """Expire dashboards once the change is visible to other requests."""
+    # expiring earlier would let another request cache the old rows
+    # under the new generation
+    transaction.on_commit(lambda: expire_dashboards(uids))
+
+
+def _expire_proposal(pid, uid=None, department=None):
+    """Expire the dashboards that show a proposal, and those of a user.
+
+    The deans and chairs of a department the proposal has left are
+    expired too.
+    """
+    uids = {uid} - {None}
+    if department:
+        uids.update(department_viewers(department))
+    proposal = Proposal.objects.filter(pk=pid).first()
+    if proposal:
+        uids.update(proposal_viewers(proposal))
+    expire_dashboards(uids)
+
+
+@receiver(pre_save, sender=Proposal)
+def proposal_note_viewers(sender, **kwargs):
+    """Note the investigator and department that a save replaces."""
+    proposal = kwargs['instance']
+    # the values loaded from the database, before this save
+    saved = proposal.__dict__.get('_saved_values', {})
+    proposal._djbeca_previous = {
+        name: saved[name] for name in ('user_id', 'department')
+        if name in saved and saved[name] != getattr(proposal, name)
+    }
+
+
+@receiver(post_save, sender=Proposal)
+def proposal_expire_dashboards(sender, **kwargs):
+    """A proposal changed so the dashboards that show it are stale."""
+    pid = kwargs['instance'].id
+    # the old investigator and department no longer show the proposal
+    previous = kwargs['instance'].__dict__.pop('_djbeca_previous', {})
+    uid = previous.get('user_id')
+    department = previous.get('department')
+    # look up the viewers after the commit, outside the row locks
+    transaction.on_commit(lambda: _expire_proposal(pid, uid, department))
+
+
+@receiver(post_delete, sender=Proposal)
+def proposal_delete_expire_dashboards(sender, **kwargs):
+    """A proposal was deleted so the dashboards that showed it are stale."""
+    # the viewers cannot be looked up once the deletion is committed
+    _expire_on_commit(proposal_viewers(kwargs['instance']))
+
+
+@receiver(post_save, sender=ProposalApprover)
+@receiver(post_delete, sender=ProposalApprover)
+@receiver(post_save, sender=ProposalImpact)
+@receiver(post_delete, sender=ProposalImpact)
+def proposal_related_expire_dashboards(sender, **kwargs):
+    """An approval or Part B changed a proposal row on the dashboards."""
+    instance = kwargs['instance']
+    pid = instance.proposal_id
+    uid = getattr(instance, 'user_id', None)
+    transaction.on_commit(lambda: _expire_proposal(pid, uid))
+
+
+@receiver(post_save, sender=Proposal)
+def proposal_sync_inbox(sender, **kwargs):
+    """Update the pending actions of a proposal after a transition."""
+    if _changed(kwargs, WORKFLOW_FIELDS[sender]):
+        pid = kwargs['instance'].id
+        # after the commit, outside the row locks of the transition
+        transaction.on_commit(lambda: sync_pending_actions(pid))
+
+
+@receiver(post_save, sender=ProposalApprover)
+@receiver(post_save, sender=ProposalImpact)
+def proposal_related_sync_inbox(sender, **kwargs):
+    """An approval or Part B changed the pending actions of a proposal."""
+    if _changed(kwargs, WORKFLOW_FIELDS[sender]):
+        pid = kwargs['instance'].proposal_id
+        transaction.on_commit(lambda: sync_pending_actions(pid))
+
+
+@receiver(post_delete, sender=ProposalApprover)
+@receiver(post_delete, sender=ProposalImpact)
+def proposal_related_delete_sync_inbox(sender, **kwargs):
+    """An approver or Part B was removed."""
+    # wait for the commit: if the proposal itself is being deleted, rows
+    # added now would outlive it
+    pid = kwargs['instance'].proposal_id
+    transaction.on_commit(lambda: sync_pending_actions(pid))
+
+
+@receiver(post_save, sender=GenericChoice)
+@receiver(post_delete, sender=GenericChoice)
+def generic_choice_clear_registry(sender, **kwargs):
+    """Every process reloads the choices once the change is committed."""
+    transaction.on_commit(clear_generic_choices)
@@ -0,0 +1,40 @@
+# -*- coding: utf-8 -*-
+
+"""Template tags for LiveWhale API content."""
+
+from django import template
+from djbeca.core.livewhale import get_content
+
+
+register = template.Library()
+
+
+class LiveWhaleContentNode(template.Node):
+    """Put LiveWhale content into the context."""
+
+    def __init__(self, varname, ctype, cid):
+        """Store the tag arguments."""
+        self.varname = varname
+        self.ctype = ctype
+        self.cid = cid
+
+    def render(self, context):
+        """Add the content to the context and render nothing."""
+        context[self.varname] = get_content(
+            self.ctype, self.cid, wait=context.get('livewhale_wait', False),
+        )
+        return ''
+
+
+@register.tag
+def get_lw_content(parser, token):
+    """Fetch LiveWhale content from the cache.
+
+    Usage: {% get_lw_content as varname ctype cid %}
+    """
+    bits = token.split_contents()
+    if len(bits) != 5 or bits[1] != 'as':
+        raise template.TemplateSyntaxError(
+            "{0} usage: {{% {0} as varname ctype cid %}}".format(bits[0]),
+        )
+    return LiveWhaleContentNode(bits[2], bits[3], bits[4])
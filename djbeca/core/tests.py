@@ -0,0 +1,461 @@
+# -*- coding: utf-8 -*-
+
+"""Tests for the proposal workflow."""
+
+import datetime
+import threading
+import unittest
+from decimal import Decimal
+
+from django.conf import settings
+from django.contrib.auth.models import Group
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client
+from django.test import SimpleTestCase
+from django.test import TestCase
+from django.test import TransactionTestCase
+from django.urls import reverse
+from djbeca.core import choices
+from djbeca.core.analytics import proposal_waits
+from djbeca.core.contacts import CO_PRINCIPAL_ROLE
+from djbeca.core.contacts import CO_PRINCIPAL_TAG
+from djbeca.core.contacts import INVESTIGATOR_SLOTS
+from djbeca.core.contacts import sync_investigators
+from djbeca.core.forms import VersionedModelForm
+from djbeca.core.funding import sync_funding
+from djbeca.core.models import OutboxMessage
+from djbeca.core.models import Proposal
+from djbeca.core.models import ProposalApprover
+from djbeca.core.models import ProposalBudget
+from djbeca.core.models import ProposalContact
+from djbeca.core.models import ProposalEvent
+from djbeca.core.models import ProposalImpact
+from djbeca.core.models import WorkdayDepartment
+from djbeca.core.models import WorkdayManager
+from djbeca.core.roles import get_roles
+from djbeca.core.utils import permissions_for
+
+
+# concurrent requests against the same proposal
+THREADS = 12
+
+
+def _proposal(user, department, **kwargs):
+    """A Part A proposal with every required field."""
+    today = datetime.date.today()
+    data = {
+        'user': user,
+        'proposal_type': 'New',
+        'funding_agency_program_name': 'Agency',
+        'grant_agency_funding_source': 'Federal',
+        'grant_agency_url': 'https://example.com/',
+        'grant_deadline_date': today + datetime.timedelta(days=30),
+        'department': department,
+        'title': 'Proposal',
+        'start_date': today,
+        'end_date': today + datetime.timedelta(days=365),
+        'project_type': 'Research',
+        'summary': 'Summary',
+        'budget_total': 1000,
+        'budget_summary': 'Budget',
+    }
+    data.update(kwargs)
+    return Proposal.objects.create(**data)
+
+
+@unittest.skipUnless(
+    connection.vendor == 'mysql', 'row locks need the MySQL database',
+)
+class ProposalStatusConcurrencyTest(TransactionTestCase):
+    """Many simultaneous approvals of one proposal apply it once."""
+
+    def setUp(self):
+        """A Part A proposal and the dean of its department."""
+        department = WorkdayDepartment.objects.create(
+            id='D001', name='Department',
+        )
+        self.dean = User.objects.create_user(
+            'dean', 'dean@example.com', 'dean',
+        )
+        WorkdayManager.objects.create(
+            department=department,
+            cid=self.dean.id,
+            email=self.dean.email,
+            role='deans',
+        )
+        investigator = User.objects.create_user(
+            'investigator', 'investigator@example.com', 'investigator',
+        )
+        self.proposal = _proposal(investigator, department.id)
+        # only the approval itself counts
+        OutboxMessage.objects.all().delete()
+
+    def _approve(self, key, responses):
+        """Post one approval, as the button does."""
+        client = Client()
+        client.force_login(self.dean)
+        try:
+            response = client.post(
+                reverse('proposal_status'),
+                {'pid': self.proposal.id, 'status': 'approve', 'key': key},
+            )
+            responses.append(response.content.decode())
+        finally:
+            connection.close()
+
+    def test_approve_once(self):
+        """Only one of the simultaneous approvals is applied."""
+        responses = []
+        threads = []
+        for count in range(THREADS):
+            # half repeat one key, like a double click, and half are new
+            key = 'double' if count % 2 else 'key{0}'.format(count)
+            threads.append(
+                threading.Thread(target=self._approve, args=(key, responses)),
+            )
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        # a repeated key replays the response of its first request
+        self.assertEqual(len(responses), THREADS)
+        self.assertEqual(
+            set(responses),
+            {'Dean/VP approved Part A', 'Part A has already been approved'},
+        )
+        self.proposal.refresh_from_db()
+        self.assertTrue(self.proposal.level3)
+        self.assertEqual(
+            ProposalEvent.objects.filter(
+                proposal=self.proposal, event=choices.EVENT_PART_A_DEAN,
+            ).count(),
+            1,
+        )
+        self.assertEqual(
+            OutboxMessage.objects.filter(
+                subject__startswith='You are Approved to begin Part B',
+            ).count(),
+            1,
+        )
+
+
+class PermissionsForTest(TestCase):
+    """permissions_for() agrees with Proposal.permissions()."""
+
+    def setUp(self):
+        """Proposals in Part A and Part B, and a user in each role."""
+        # roles and group holders are cached by user ID
+        cache.clear()
+        department = WorkdayDepartment.objects.create(
+            id='D001', name='Department',
+        )
+        self.users = {}
+        for name in (
+            'investigator', 'dean', 'chair', 'cfo', 'provost', 'osp',
+            'approver', 'outsider',
+        ):
+            self.users[name] = User.objects.create_user(
+                name, '{0}@example.com'.format(name), name,
+            )
+        for role in ('deans', 'chairs'):
+            user = self.users[role[:-1]]
+            WorkdayManager.objects.create(
+                department=department, cid=user.id, email=user.email,
+                role=role,
+            )
+        for name, group in (
+            ('cfo', settings.CFO_GROUP),
+            ('provost', settings.PROVOST_GROUP),
+            ('osp', settings.OSP_GROUP),
+        ):
+            self.users[name].groups.add(Group.objects.create(name=group))
+        investigator = self.users['investigator']
+        part_a = _proposal(investigator, department.id)
+        part_b = _proposal(investigator, department.id, level3=True)
+        ProposalImpact.objects.create(proposal=part_b)
+        approved = _proposal(investigator, department.id, level3=True)
+        ProposalImpact.objects.create(proposal=approved)
+        for proposal, steps, step2 in (
+            (part_a, '1', False),
+            (part_b, '3', False),
+            (approved, '2', True),
+        ):
+            for name in ('approver', 'provost'):
+                ProposalApprover.objects.create(
+                    user=self.users[name], proposal=proposal, steps=steps,
+                    step2=step2,
+                )
+
+    def test_every_role(self):
+        """Each user gets the same permissions either way."""
+        for name, user in self.users.items():
+            proposals = list(Proposal.objects.order_by('id'))
+            expected = {
+                proposal.id: proposal.permissions(user)
+                for proposal in Proposal.objects.order_by('id')
+            }
+            with self.subTest(user=name):
+                self.assertEqual(permissions_for(user, proposals), expected)
+
+    def test_query_count(self):
+        """Two queries whatever the number of proposals."""
+        user = self.users['approver']
+        get_roles(user)
+        proposals = list(Proposal.objects.order_by('id'))
+        with self.assertNumQueries(2):
+            perms = permissions_for(user, proposals)
+        self.assertEqual(
+            [perms[proposal.id]['approver'] for proposal in proposals],
+            [True, True, False],
+        )
+
+
+class SyncFundingTest(TestCase):
+    """The funding sources of a budget follow the submitted rows."""
+
+    def setUp(self):
+        """A budget with two funding sources."""
+        user = User.objects.create_user('pi', 'pi@example.com', 'pi')
+        proposal = _proposal(user, 'D001')
+        self.budget = ProposalBudget.objects.create(
+            proposal=proposal, plan_b='Plan B',
+        )
+        self.kept = self.budget.funding.create(
+            amount=Decimal('100.00'), source='Gift', status='Secured',
+        )
+        self.removed = self.budget.funding.create(
+            amount=Decimal('200.00'), source='Division', status='Requested',
+        )
+
+    def _rows(self):
+        """The (amount, source, status) of the funding sources."""
+        return list(
+            self.budget.funding.order_by('id').values_list(
+                'amount', 'source', 'status',
+            ),
+        )
+
+    def test_update_remove_create(self):
+        """Changed rows are updated, missing ones removed, new ones added."""
+        sync_funding(self.budget, [
+            {
+                'id': self.kept.id, 'amount': '$1,500.00', 'source': 'Gift',
+                'status': 'Requested',
+            },
+            {
+                'id': None, 'amount': '50', 'source': 'Department',
+                'status': 'Secured',
+            },
+        ])
+        self.assertEqual(self._rows(), [
+            (Decimal('1500.00'), 'Gift', 'Requested'),
+            (Decimal('50.00'), 'Department', 'Secured'),
+        ])
+        self.assertTrue(self.budget.funding.filter(pk=self.kept.id).exists())
+        self.assertFalse(
+            self.budget.funding.filter(pk=self.removed.id).exists(),
+        )
+
+    def test_blank_amount(self):
+        """A blank amount leaves the saved amount as it is."""
+        sync_funding(self.budget, [
+            {
+                'id': self.kept.id, 'amount': '', 'source': 'Gift',
+                'status': 'Secured',
+            },
+            {
+                'id': self.removed.id, 'amount': '', 'source': 'Division',
+                'status': 'Secured',
+            },
+        ])
+        self.assertEqual(self._rows(), [
+            (Decimal('100.00'), 'Gift', 'Secured'),
+            (Decimal('200.00'), 'Division', 'Secured'),
+        ])
+
+
+class SyncInvestigatorsTest(TestCase):
+    """The Co-Principal Investigators follow the submitted form."""
+
+    def setUp(self):
+        """A proposal without contacts."""
+        user = User.objects.create_user('pi', 'pi@example.com', 'pi')
+        self.proposal = _proposal(user, 'D001')
+
+    def _data(self, *names):
+        """Cleaned data of the InvestigatorsForm for some names."""
+        data = {}
+        for slot in range(1, INVESTIGATOR_SLOTS + 1):
+            name = names[slot - 1] if slot <= len(names) else ''
+            data['name{0}'.format(slot)] = name
+            data['institution{0}'.format(slot)] = name and 'Institution'
+        return data
+
+    def _names(self):
+        """The (ID, name) of the contacts in form order."""
+        return list(
+            self.proposal.contact.order_by('created_at', 'id').values_list(
+                'id', 'name',
+            ),
+        )
+
+    def test_create_then_update(self):
+        """One contact per slot, and a later save keeps their IDs."""
+        sync_investigators(self.proposal, self._data('Ada', 'Grace'))
+        created = self._names()
+        self.assertEqual(
+            [name for _, name in created],
+            ['Ada', 'Grace', '', '', ''],
+        )
+        self.assertEqual(
+            self.proposal.contact.filter(
+                role=CO_PRINCIPAL_ROLE, tags__name=CO_PRINCIPAL_TAG,
+            ).count(),
+            INVESTIGATOR_SLOTS,
+        )
+
+        sync_investigators(self.proposal, self._data('Ada', 'Hedy'))
+        self.assertEqual(self._names(), [
+            (cid, 'Hedy' if slot == 1 else name)
+            for slot, (cid, name) in enumerate(created)
+        ])
+
+    def test_adopt_tagged_contacts(self):
+        """Contacts found by their tag get the role, not a duplicate."""
+        contact = ProposalContact.objects.create(
+            proposal=self.proposal, name='Ada', institution='Institution',
+        )
+        contact.tags.add(CO_PRINCIPAL_TAG)
+        sync_investigators(self.proposal, self._data('Ada', 'Grace'))
+        contact.refresh_from_db()
+        self.assertEqual(contact.role, CO_PRINCIPAL_ROLE)
+        self.assertEqual(self._names()[0], (contact.id, 'Ada'))
+        self.assertEqual(
+            self.proposal.contact.count(), INVESTIGATOR_SLOTS,
+        )
+
+
+class TitleForm(VersionedModelForm):
+    """A versioned form with a single field."""
+
+    class Meta:
+        """Attributes about the form class."""
+
+        model = Proposal
+        fields = ['title']
+
+
+class EditConflictsTest(TestCase):
+    """Edits saved meanwhile are reported rather than overwritten."""
+
+    def setUp(self):
+        """A proposal at version 0."""
+        user = User.objects.create_user('pi', 'pi@example.com', 'pi')
+        self.proposal = _proposal(user, 'D001', title='Mine')
+
+    def _form(self, data):
+        """A valid bound form for the saved proposal."""
+        form = TitleForm(
+            data, instance=Proposal.objects.get(pk=self.proposal.pk),
+        )
+        self.assertTrue(form.is_valid(), form.errors)
+        return form
+
+    def _version(self):
+        """The saved version."""
+        return Proposal.objects.values_list('version', flat=True).get(
+            pk=self.proposal.pk,
+        )
+
+    def test_current_version(self):
+        """Nobody else saved, so the form claims the next version."""
+        form = self._form({'title': 'Edited', 'version': 0})
+        self.assertEqual(form.edit_conflicts(), [])
+        self.assertEqual(self._version(), 1)
+
+    def test_stale_version(self):
+        """A differing edit saved meanwhile is a conflict until resubmit."""
+        Proposal.objects.filter(pk=self.proposal.pk).update(
+            title='Theirs', version=1,
+        )
+        form = self._form({'title': 'Edited', 'version': 0})
+        self.assertEqual(
+            form.edit_conflicts(), [('Project title', 'Edited', 'Theirs')],
+        )
+        self.assertEqual(self._version(), 1)
+        # the form now carries the saved version
+        self.assertEqual(self._form(form.data).edit_conflicts(), [])
+        self.assertEqual(self._version(), 2)
+
+    def test_stale_version_same_values(self):
+        """An edit that agrees with the one saved meanwhile goes ahead."""
+        Proposal.objects.filter(pk=self.proposal.pk).update(
+            title='Edited', version=1,
+        )
+        form = self._form({'title': 'Edited', 'version': 0})
+        self.assertEqual(form.edit_conflicts(), [])
+        self.assertEqual(self._version(), 2)
+
+    def test_missing_version(self):
+        """A form submitted without its version is checked field by field."""
+        form = self._form({'title': 'Edited'})
+        self.assertEqual(
+            form.edit_conflicts(), [('Project title', 'Edited', 'Mine')],
+        )
+
+
+class ProposalWaitsTest(SimpleTestCase):
+    """The approval waits computed from the events of a proposal."""
+
+    def _at(self, hour):
+        """A time on a fixed day."""
+        return datetime.datetime(2024, 1, 1, hour)
+
+    def test_full_workflow(self):
+        """Every stage starts at its submission or the last Part B step."""
+        events = [
+            (choices.EVENT_PART_A_SUBMITTED, 1, self._at(0)),
+            (choices.EVENT_PART_A_DEAN, 2, self._at(1)),
+            (choices.EVENT_PART_A_APPROVER, 3, self._at(2)),
+            (choices.EVENT_PART_B_SUBMITTED, 1, self._at(3)),
+            (choices.EVENT_PART_B_DEAN, 2, self._at(4)),
+            (choices.EVENT_PART_B_APPROVER, 3, self._at(5)),
+            (choices.EVENT_PART_B_CFO, 4, self._at(6)),
+            (choices.EVENT_PART_B_PROVOST, 5, self._at(7)),
+        ]
+        self.assertEqual(list(proposal_waits(events)), [
+            ('level3a', 2, self._at(0), self._at(1)),
+            ('step1', 3, self._at(0), self._at(2)),
+            ('level3b', 2, self._at(3), self._at(4)),
+            ('step2', 3, self._at(3), self._at(5)),
+            ('level2', 4, self._at(5), self._at(6)),
+            ('level1', 5, self._at(5), self._at(7)),
+        ])
+
+    def test_reset(self):
+        """A reset ends the round and the next save starts a new one."""
+        events = [
+            (choices.EVENT_PART_A_SUBMITTED, 1, self._at(0)),
+            (choices.EVENT_NEEDS_WORK, 2, self._at(1)),
+            # no round is open, so this approval has no start
+            (choices.EVENT_PART_A_APPROVER, 3, self._at(2)),
+            (choices.EVENT_PART_A_UPDATED, 1, self._at(3)),
+            (choices.EVENT_PART_A_UPDATED, 1, self._at(4)),
+            (choices.EVENT_PART_A_DEAN, 2, self._at(5)),
+        ]
+        self.assertEqual(list(proposal_waits(events)), [
+            ('level3a', 2, self._at(3), self._at(5)),
+        ])
+
+    def test_history_mid_round(self):
+        """Only the stages whose start is in the history have a wait."""
+        events = [
+            (choices.EVENT_PART_B_DEAN, 2, self._at(0)),
+            (choices.EVENT_PART_B_CFO, 4, self._at(1)),
+        ]
+        self.assertEqual(list(proposal_waits(events)), [
+            ('level2', 4, self._at(0), self._at(1)),
+        ])
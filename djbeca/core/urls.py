@@ -61,6 +61,12 @@ urlpatterns = [
         views.proposal_detail,
         name='proposal_detail',
     ),
+    # Part A: workflow history
+    path(
+        'proposal/<int:pid>/timeline/',
+        views.proposal_timeline,
+        name='proposal_timeline',
+    ),
     # Part A: update
     path(
         'proposal/<int:pid>/update/',
@@ -122,7 +128,20 @@ urlpatterns = [
     path(
         'cache/clear/', views.clear_cache, name='clear_cache_get',
     ),
+    # pending actions inbox and its badge count
+    path('inbox/count/', views.inbox_count, name='inbox_count'),
+    path('inbox/', views.inbox, name='inbox'),
+    # API content cache counters
+    path(
+        'cache/livewhale/stats/',
+        views.livewhale_stats,
+        name='livewhale_stats',
+    ),
+    # approval stage SLA report
+    path('report/sla/', views.sla_report, name='sla_report'),
     # Home dashboard
     # -------------------------------------------------------------------------
+    # dashboard rows as a JSON fragment for filters and paging
+    path('proposal/data/', views.proposal_data, name='proposal_data'),
     path('', views.home, name='home'),
 ]
@@ -1,45 +1,212 @@
 # -*- coding: utf-8 -*-
 
+import datetime
+
 from django.conf import settings
+from django.db import router
 from django.db.models import Q
+from django.db.models.signals import post_save
+from django.utils import timezone
+from djbeca.core.models import IdempotencyKey
 from djbeca.core.models import Proposal
-from djtools.utils.users import in_group
-from djtools.utils.workday import get_managers
+from djbeca.core.models import ProposalApprover
+from djbeca.core.models import ProposalImpact
+from djbeca.core.roles import get_roles
+
+
+# OSP dashboard shows proposals created on or after this date
+OSP_START_DATE = datetime.datetime(2023, 1, 1)
+# dashboard status filters
+STATUS_FILTERS = {
+    'level3': Q(level3=False, decline=False, closed=False),
+    'impact': Q(level3=True, save_submit=False, decline=False, closed=False),
+    'declined': Q(decline=True),
+    'closed': Q(closed=True),
+    'awarded': Q(awarded=True),
+    # these use the Proposal.objects.with_stage() annotations
+    'level1': Q(
+        ready_for_level1=True, step2_complete=False, decline=False,
+        closed=False,
+    ),
+    'approved': Q(step2_complete=True, decline=False, closed=False),
+}
+STAGE_STATUSES = frozenset(['level1', 'approved'])
 
 
 def get_proposals(user):
     """Return all proposals for a user."""
-    depts = False
-    depts_props = False
-    dean = get_managers('deans', cid=user.id)
-    chair = get_managers('chairs', cid=user.id)
-    group = in_group(user, settings.OSP_GROUP)
+    roles = get_roles(user)
+    dean = roles['dean']
     depts = []
-    proposals = []
-    if group:
-        proposals = Proposal.objects.filter(created_at__year__gte='2023')
+    if roles['osp']:
+        # a range rather than __year so that the created_at index is used
+        proposals = Proposal.objects.filter(created_at__gte=OSP_START_DATE)
     else:
-        # obtain user proposals and those where the user is an adhoc approver
+        # the union of proposal IDs from the user's proposals, those where
+        # the user is an adhoc approver, and those from departments the
+        # user manages. each part uses its own index and the union removes
+        # duplicates. the IDs are fetched first because MySQL runs an
+        # IN (... UNION ...) subquery again for every proposal row.
+        pids = [
+            Proposal.objects.filter(user=user).values_list(
+                'id', flat=True,
+            ).order_by(),
+            ProposalApprover.objects.filter(user=user).values_list(
+                'proposal_id', flat=True,
+            ).order_by(),
+        ]
+        depts = roles['dean'] or roles['chair']
+        if depts:
+            pids.append(
+                Proposal.objects.filter(department__in=depts).values_list(
+                    'id', flat=True,
+                ).order_by(),
+            )
         proposals = Proposal.objects.filter(
-            Q(user=user) | Q(approvers__user=user),
+            pk__in=list(pids[0].union(*pids[1:])),
         )
-        if dean:
-            for dept in dean['managed']:
-                depts.append(dept.split('/')[-2])
-            depts_props = Proposal.objects.filter(department__in=depts)
-            # merge them all together
-            proposals = depts_props | proposals
-        elif chair:
-            did = chair['departments'][0].split('/')[-2]
-            depts_props = Proposal.objects.filter(department=did)
-            proposals = depts_props | proposals
-
-    # finally order by
-    if proposals:
-        proposals = proposals.order_by('-grant_deadline_date')
+
+    # finally fetch the related data the dashboard displays and order by
+    # a unique key so that the dashboard can be paged by keyset
+    proposals = proposals.dashboard().order_by('-grant_deadline_date', '-id')
 
     return {
         'objects': proposals,
         'dean': dean,
         'depts': depts,
     }
+
+
+def permissions_for(user, proposals):
+    """Return the permissions of the user for each proposal by proposal ID.
+
+    The number of queries does not depend on the number of proposals.
+    """
+    proposals = list(proposals)
+    pids = [proposal.id for proposal in proposals]
+    approvers = {
+        approver.proposal_id: approver
+        for approver in ProposalApprover.objects.filter(
+            user=user, proposal__in=pids,
+        )
+    }
+    impacts = set(
+        ProposalImpact.objects.filter(
+            proposal__in=pids,
+        ).values_list('proposal_id', flat=True),
+    )
+    return {
+        proposal.id: proposal.permissions(user, approvers, impacts)
+        for proposal in proposals
+    }
+
+
+def get_dashboard_page(user, proposals, filters):
+    """Apply the dashboard filters and return one keyset page of proposals.
+
+    filters is the cleaned data from DashboardFilterForm. the cursor is the
+    (grant_deadline_date, id) pair of the last proposal on the previous page.
+    """
+    status = filters.get('status')
+    if status in STAGE_STATUSES:
+        proposals = proposals.with_stage()
+    if status:
+        proposals = proposals.filter(STATUS_FILTERS[status])
+    if filters.get('department'):
+        proposals = proposals.filter(department=filters['department'])
+    if filters.get('deadline_from'):
+        proposals = proposals.filter(
+            grant_deadline_date__gte=filters['deadline_from'],
+        )
+    if filters.get('deadline_to'):
+        proposals = proposals.filter(
+            grant_deadline_date__lte=filters['deadline_to'],
+        )
+    cursor = filters.get('cursor')
+    if cursor:
+        deadline, pid = cursor
+        proposals = proposals.filter(
+            Q(grant_deadline_date__lt=deadline) |
+            Q(grant_deadline_date=deadline, id__lt=pid),
+        )
+
+    # fetch one extra row to find out if there is another page
+    limit = settings.DASHBOARD_PAGE_SIZE
+    page = list(proposals[:limit + 1])
+    next_cursor = None
+    if len(page) > limit:
+        page = page[:limit]
+        last = page[-1]
+        next_cursor = '{0}.{1}'.format(
+            last.grant_deadline_date.isoformat(), last.id,
+        )
+    # permissions for the buttons on each row
+    perms = permissions_for(user, page)
+    for proposal in page:
+        proposal.perms = perms[proposal.id]
+
+    return {
+        'objects': page,
+        'next': next_cursor,
+    }
+
+
+def guarded_update(instance, guard, **changes):
+    """Apply changes to a row only if it still matches the guard.
+
+    The check and the write are a single UPDATE ... WHERE, so of two
+    concurrent requests only one makes the change. Returns True if this
+    call made it, in which case the instance is updated and post_save is
+    sent like save() would, so that the signal receivers still run.
+    """
+    model = type(instance)
+    if hasattr(instance, 'updated_at'):
+        changes.setdefault('updated_at', timezone.now())
+    updated = model.objects.filter(pk=instance.pk, **guard).update(**changes)
+    if not updated:
+        return False
+    for field, value in changes.items():
+        setattr(instance, field, value)
+    # the row now has these values, so they are not dirty
+    if hasattr(instance, '_track'):
+        instance._track(changes)
+    post_save.send(
+        sender=model,
+        instance=instance,
+        created=False,
+        update_fields=frozenset(changes),
+        raw=False,
+        using=router.db_for_write(model),
+    )
+    return True
+
+
+def claim_version(instance, expected):
+    """Move a row to its next version if it is still at the expected one.
+
+    The UPDATE ... WHERE version = expected succeeds for only one of two
+    editors who loaded the same version, and it holds the row lock only
+    until the saving transaction ends, not while the form is edited.
+    Returns False if someone else saved the row in the meantime.
+    """
+    model = type(instance)
+    claimed = model.objects.filter(
+        pk=instance.pk, version=expected,
+    ).update(version=expected + 1)
+    if not claimed:
+        return False
+    instance.version = expected + 1
+    instance._track(['version'])
+    return True
+
+
+def purge_idempotency_keys():
+    """Delete the idempotency keys older than IDEMPOTENCY_KEY_TTL seconds.
+
+    A retry comes within seconds or minutes of the request, so the keys
+    are only needed for a while.
+    """
+    expired = datetime.datetime.now() - datetime.timedelta(
+        seconds=settings.IDEMPOTENCY_KEY_TTL,
+    )
+    return IdempotencyKey.objects.filter(created_at__lt=expired).delete()[0]
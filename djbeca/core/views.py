@@ -2,41 +2,72 @@
 
 """Views for all requests."""
 
-import json
+import datetime
 import logging
-from datetime import datetime
-from decimal import Decimal
-from re import sub
 
-import requests
 from django.conf import settings
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.models import User
-from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Max
 from django.http import Http404
 from django.http import HttpResponse
 from django.http import HttpResponseRedirect
+from django.http import JsonResponse
 from django.shortcuts import get_object_or_404
 from django.shortcuts import render
 from django.urls import reverse_lazy
 from django.utils.safestring import mark_safe
 from django.views.decorators.csrf import csrf_exempt
 from djbeca.core import forms
+from djbeca.core import livewhale
 from djbeca.core.choices import BUDGET_FUNDING_SOURCE
 from djbeca.core.choices import BUDGET_FUNDING_STATUS
+from djbeca.core.choices import DASHBOARD_STATUS_CHOICES
+from djbeca.core.choices import EVENT_AWARDED
+from djbeca.core.choices import EVENT_CLOSED
+from djbeca.core.choices import EVENT_DECLINED
+from djbeca.core.choices import EVENT_NEEDS_WORK
+from djbeca.core.choices import EVENT_PART_A_APPROVER
+from djbeca.core.choices import EVENT_PART_A_DEAN
+from djbeca.core.choices import EVENT_PART_A_SUBMITTED
+from djbeca.core.choices import EVENT_PART_A_UPDATED
+from djbeca.core.choices import EVENT_PART_B_APPROVER
+from djbeca.core.choices import EVENT_PART_B_CFO
+from djbeca.core.choices import EVENT_PART_B_DEAN
+from djbeca.core.choices import EVENT_PART_B_PROVOST
+from djbeca.core.choices import EVENT_PART_B_SAVED
+from djbeca.core.choices import EVENT_PART_B_SUBMITTED
+from djbeca.core.choices import EVENT_REOPENED
+from djbeca.core.choices import PENDING_ACTION_CHOICES
+from djbeca.core.choices import PROPOSAL_EVENT_CHOICES
+from djbeca.core.choices import SLA_STAGE_CHOICES
+from djbeca.core.contacts import co_principals
+from djbeca.core.contacts import sync_investigators
+from djbeca.core.dashboard import dashboard_rows
+from djbeca.core.events import record_event
+from djbeca.core.events import timeline
+from djbeca.core.funding import funding_rows
+from djbeca.core.funding import sync_funding
+from djbeca.core.mail import queue_mail
+from djbeca.core.models import IdempotencyKey
 from djbeca.core.models import Proposal
 from djbeca.core.models import ProposalApprover
 from djbeca.core.models import ProposalBudget
-from djbeca.core.models import ProposalBudgetFunding
-from djbeca.core.models import ProposalContact
 from djbeca.core.models import ProposalImpact
-from djbeca.core.utils import get_proposals
-from djtools.utils.mail import send_mail
+from djbeca.core.models import StageRollup
+from djbeca.core.roles import get_group_user
+from djbeca.core.roles import get_roles
+from djbeca.core.utils import guarded_update
+from djbeca.core.utils import permissions_for
+from djbeca.core.workday import clear_workday_cache
+from djbeca.core.workday import department_all
+from djbeca.core.workday import department_dean
+from djbeca.core.workday import department_detail
+from djbeca.core.workday import department_person
+from djbeca.core.workday import get_managers
 from djtools.utils.users import in_group
-from djtools.utils.workday import department_all
-from djtools.utils.workday import department_person
-from djtools.utils.workday import get_managers
 
 
 logger = logging.getLogger('debug_logfile')
@@ -44,13 +75,11 @@ DEBUG = settings.DEBUG
 REQUIRED_ATTRIBUTE = settings.REQUIRED_ATTRIBUTE
 OSP_GROUP = settings.OSP_GROUP
 
-VEEP = User.objects.filter(groups__name=settings.CFO_GROUP)[0]
-PROVOST = User.objects.filter(groups__name=settings.PROVOST_GROUP)[0]
-PRESIDENT = User.objects.filter(groups__name=settings.PRESIDENT_GROUP)[0]
-
 PROPOSAL_EMAIL_LIST = settings.PROPOSAL_EMAIL_LIST
 SERVER_EMAIL = settings.SERVER_EMAIL
 TEST_EMAILS = [settings.MANAGERS[0][1], PROPOSAL_EMAIL_LIST[0]]
+# Part B approvals that are cleared when a proposal goes back a step
+IMPACT_RESET_FIELDS = ['disclosure_assurance', 'level3', 'level2', 'level1']
 
 if DEBUG:
     bcc = TEST_EMAILS
@@ -63,16 +92,36 @@ else:
 def home(request):
     """Dashboard home page view."""
     user = request.user
-    group = in_group(user, OSP_GROUP)
     if user.is_authenticated:
-        proposals = get_proposals(user)
+        roles = get_roles(user)
+        group = roles['osp']
+        form_filter = forms.DashboardFilterForm(request.GET)
+        filters = {}
+        if form_filter.is_valid():
+            filters = form_filter.cleaned_data
+        rows = dashboard_rows(request, filters)
+        depts = None
+        queues = None
+        if group:
+            depts = department_all(choices=True)
+            # entries cached before the counts were added have none
+            counts = rows.get('counts') or {}
+            queues = [
+                (status, name, counts[status])
+                for status, name in DASHBOARD_STATUS_CHOICES
+                if status in counts
+            ]
         response = render(
             request,
             'home.html',
             {
-                'proposals': proposals['objects'],
-                'dean': proposals['dean'],
+                'rows': mark_safe(rows['html']),
+                'next_cursor': rows['next'],
+                'dean': roles['dean'],
                 'group': group,
+                'form_filter': form_filter,
+                'depts': depts,
+                'queues': queues,
             },
         )
     else:
@@ -82,6 +131,70 @@ def home(request):
 
 
 @login_required
+def proposal_data(request):
+    """Dashboard rows for the filters and cursor as a JSON fragment."""
+    form_filter = forms.DashboardFilterForm(request.GET)
+    if not form_filter.is_valid():
+        return JsonResponse({'errors': form_filter.errors}, status=400)
+    rows = dashboard_rows(request, form_filter.cleaned_data)
+    return JsonResponse({'html': rows['html'], 'next': rows['next']})
+
+
+@login_required
+def inbox(request):
+    """Proposals waiting on an action from the user."""
+    actions = request.user.pending_actions.select_related(
+        'proposal__user',
+    ).order_by('created_at')
+    action = request.GET.get('action')
+    if action in dict(PENDING_ACTION_CHOICES):
+        actions = actions.filter(action=action)
+    actions = list(actions)
+    # the same permissions as the proposal views, in two queries
+    perms = permissions_for(
+        request.user, {a.proposal_id: a.proposal for a in actions}.values(),
+    )
+    for a in actions:
+        a.perms = perms[a.proposal_id]
+    return render(
+        request,
+        'inbox.html',
+        {
+            'actions': actions,
+            'action': action,
+            'action_choices': PENDING_ACTION_CHOICES,
+        },
+    )
+
+
+@login_required
+def inbox_count(request):
+    """Number of pending actions for the inbox badge."""
+    return JsonResponse({'count': request.user.pending_actions.count()})
+
+
+@login_required
+def proposal_timeline(request, pid):
+    """The workflow history of a proposal as JSON."""
+    proposal = get_object_or_404(Proposal, pk=pid)
+    if not proposal.permissions(request.user)['view']:
+        raise Http404
+    labels = dict(PROPOSAL_EVENT_CHOICES)
+    return JsonResponse({
+        'events': [
+            {
+                'event': event,
+                'label': labels[event],
+                'created_at': created_at.isoformat(),
+                'actor': '{0} {1}'.format(first, last) if last else None,
+            }
+            for event, created_at, first, last in timeline(proposal)
+        ],
+    })
+
+
+@login_required
+@transaction.atomic
 def impact_form(request, pid):
     """Proposal Form Part B view."""
     proposal = get_object_or_404(Proposal, pk=pid)
@@ -121,21 +234,10 @@ def impact_form(request, pid):
     for counter, doc in enumerate(proposal.documents.all()):
         docs[counter] = doc
 
+    conflicts = []
     if request.method == 'POST':
         # budget funding sources
-        sources = []
-        sids = request.POST.getlist('sid[]')
-        amount = request.POST.getlist('amount[]')
-        source = request.POST.getlist('source[]')
-        status = request.POST.getlist('status[]')
-        for count, _ in enumerate(sids):
-            # skip doop-master container
-            if count != 0:
-                sources.append({
-                    'amount': amount[count],
-                    'source': source[count],
-                    'status': status[count],
-                })
+        sources = funding_rows(request.POST)
 
         form_impact = forms.ImpactForm(
             request.POST,
@@ -189,6 +291,18 @@ def impact_form(request, pid):
             form_doc2.is_valid() and
             form_doc3.is_valid()
         )
+        if valid:
+            # someone else may have saved Part B since it was loaded
+            sid = transaction.savepoint()
+            conflicts = (
+                form_impact.edit_conflicts() + form_budget.edit_conflicts()
+            )
+            if conflicts:
+                # keep the version that the other form might have claimed
+                transaction.savepoint_rollback(sid)
+                valid = False
+            else:
+                transaction.savepoint_commit(sid)
         if valid:
             # proposal impact
             impact = form_impact.save(commit=False)
@@ -203,37 +317,8 @@ def impact_form(request, pid):
             budget = form_budget.save(commit=False)
             budget.proposal = proposal
             budget.save()
-            # remove deleted budget funding sources
-            sources_list = [source.id for source in budget.funding.all()]
-            dif = set(sources_list).difference(sids)
-            if dif:
-                for sid_dif in list(dif):
-                    funding = ProposalBudgetFunding.objects.get(pk=sid_dif)
-                    funding.delete()
-            # add or update budget funding sources
-            for index, _ in enumerate(sids):
-                # skip doop-master container
-                if index != 0:
-                    if sids[index]:
-                        fid = int(sids[int(index)])
-                    else:
-                        fid = None
-                    try:
-                        funding = ProposalBudgetFunding.objects.get(pk=fid)
-                    except ProposalBudgetFunding.DoesNotExist:
-                        funding = ProposalBudgetFunding()
-                        funding.budget = budget
-                    if amount[index]:
-                        # strip any non-numeric characters
-                        funding_amount = 0
-                        try:
-                            funding_amount = Decimal(sub(r'[^\d.]', '', amount[index]))
-                        except Exception:
-                            pass
-                        funding.amount = funding_amount
-                    funding.source = source[index]
-                    funding.status = status[index]
-                    funding.save()
+            # add, update, and remove budget funding sources
+            sync_funding(budget, sources)
             # proposal comments (not a ModelForm)
             if request.POST.get('comments-comments'):
                 form_comments.is_valid()
@@ -261,6 +346,7 @@ def impact_form(request, pid):
                 # set the save submit flag so PI cannot update
                 proposal.save_submit = True
                 proposal.save()
+                record_event(proposal, user, EVENT_PART_B_SUBMITTED)
                 # email approvers
                 subject = (
                     'Routing & Authorization Form Part B: '
@@ -280,7 +366,7 @@ def impact_form(request, pid):
                 frum = proposal.user.email
                 if to_list:
                     # send the email to Approvers
-                    send_mail(
+                    queue_mail(
                         request,
                         to_list,
                         subject,
@@ -291,13 +377,7 @@ def impact_form(request, pid):
                         bcc=bcc,
                     )
                 # email Division Dean (level3)
-                dean = None
-                for man in get_managers('deans'):
-                    for dept in man['managed']:
-                        did = dept.split('/')[-2]
-                        if did == proposal.department:
-                            dean = man
-                            break
+                dean = department_dean(proposal.department)
                 # staff do not have deans so no need to send email
                 if dean:
                     subject = (
@@ -314,7 +394,7 @@ def impact_form(request, pid):
                         proposal.to_list = to_list
                         to_list = TEST_EMAILS
                     # send the email
-                    send_mail(
+                    queue_mail(
                         request,
                         to_list,
                         subject,
@@ -338,7 +418,7 @@ def impact_form(request, pid):
 
                 frum = PROPOSAL_EMAIL_LIST[0]
                 # send the email
-                send_mail(
+                queue_mail(
                     request,
                     to_list,
                     subject,
@@ -351,6 +431,7 @@ def impact_form(request, pid):
                 return HttpResponseRedirect(reverse_lazy('impact_success'))
             else:
                 proposal.save()
+                record_event(proposal, user, EVENT_PART_B_SAVED)
                 messages.add_message(
                     request,
                     messages.SUCCESS,
@@ -409,6 +490,7 @@ def impact_form(request, pid):
             'form_doc1': form_doc1,
             'form_doc2': form_doc2,
             'form_doc3': form_doc3,
+            'conflicts': conflicts,
             'osp': group,
             'perms': perms,
             'sources': sources,
@@ -417,6 +499,7 @@ def impact_form(request, pid):
 
 
 @login_required
+@transaction.atomic
 def proposal_form(request, pid=None):
     """Proposal Form Part A view."""
     investi = None
@@ -441,13 +524,12 @@ def proposal_form(request, pid=None):
         elif (proposal.decline or proposal.closed) and not group:
             return HttpResponseRedirect(reverse_lazy('home'))
         else:
-            investigators = proposal.contact.filter(
-                tags__name='Co-Principal Investigators',
-            )
+            investigators = co_principals(proposal)
     if group:
         depts = department_all(choices=True)
     else:
         depts = department_person(user.id, choices=True)
+    conflicts = []
     if request.method == 'POST':
         form = forms.ProposalForm(
             depts,
@@ -460,30 +542,27 @@ def proposal_form(request, pid=None):
             prefix='investi',
             use_required_attribute=REQUIRED_ATTRIBUTE,
         )
-        if form.is_valid():
+        valid = form.is_valid()
+        if valid:
+            # someone else may have saved the proposal since it was loaded
+            conflicts = form.edit_conflicts()
+            valid = not conflicts
+        if valid:
             data = form.save(commit=False)
             # we don't want to change ownership if someone else with
             # permission is updating the proposal
             if not proposal:
                 data.user = user
             data.save()
+            record_event(
+                data,
+                user,
+                EVENT_PART_A_UPDATED if proposal else EVENT_PART_A_SUBMITTED,
+            )
 
             form_investi.is_valid()
-
-            # delete the old objects because it's just easier this way
-            if proposal:
-                if investigators:
-                    investigators.delete()
-            # obtain our new set of contacts
-            investigators = form_investi.cleaned_data
-            for insti in list(range(1, 6)):
-                investigator = ProposalContact(
-                    proposal=data,
-                    name=investigators['name{0}'.format(insti)],
-                    institution=investigators['institution{0}'.format(insti)],
-                )
-                investigator.save()
-                investigator.tags.add('Co-Principal Investigators')
+            # only write the contacts that changed
+            sync_investigators(data, form_investi.cleaned_data)
 
             # send emails only if we have a new proposal or a revised proposal
             if not proposal or data.opened:
@@ -492,13 +571,7 @@ def proposal_form(request, pid=None):
                 for approver in data.approvers.all():
                     to_list.append(approver.user.email)
                 # check for a dean
-                dean = None
-                for man in get_managers('deans'):
-                    for dept in man['managed']:
-                        did = dept.split('/')[-2]
-                        if did == data.department:
-                            dean = man
-                            break
+                dean = department_dean(data.department)
                 if dean:
                     # Division dean's email
                     to_list.append([dean['email']])
@@ -528,7 +601,7 @@ def proposal_form(request, pid=None):
                 )
                 if not data.save_submit:
                     frum = PROPOSAL_EMAIL_LIST[0]
-                    send_mail(
+                    queue_mail(
                         request,
                         to_list,
                         subject,
@@ -551,7 +624,7 @@ def proposal_form(request, pid=None):
                 # OSP can update proposals after save/submit
                 if not data.save_submit:
                     frum = PROPOSAL_EMAIL_LIST[0]
-                    send_mail(
+                    queue_mail(
                         request,
                         to_list,
                         subject,
@@ -602,11 +675,14 @@ def proposal_form(request, pid=None):
         request,
         'proposal/form.html',
         {
+            'conflicts': conflicts,
             'form': form,
             'perms': perms,
             'form_investi': form_investi,
             'osp': group,
             'depts': depts,
+            # a new PI is copied from Workday in the background
+            'dept_loading': not group and not depts,
         },
     )
 
@@ -614,18 +690,16 @@ def proposal_form(request, pid=None):
 @login_required
 def proposal_detail(request, pid):
     """Proposal detail view."""
-    proposal = get_object_or_404(Proposal, pk=pid)
+    proposal = get_object_or_404(Proposal.objects.dashboard(), pk=pid)
     user = request.user
 
     # verify that the user can view this proposal
     # and if they are an approver or not
-    perms = proposal.permissions(user)
+    perms = permissions_for(user, [proposal])[proposal.id]
     if not perms['view']:
         raise Http404
 
-    co_principals = proposal.contact.filter(
-        tags__name='Co-Principal Investigators',
-    )
+    investigators = co_principals(proposal)
 
     try:
         form_impact = forms.ImpactForm(
@@ -652,7 +726,7 @@ def proposal_detail(request, pid):
         'proposal/detail.html',
         {
             'proposal': proposal,
-            'co_principals': co_principals,
+            'co_principals': investigators,
             'perms': perms,
             'impacts': form_impact,
             'excludes': excludes,
@@ -661,6 +735,7 @@ def proposal_detail(request, pid):
 
 
 @login_required
+@transaction.atomic
 def proposal_approver(request, pid=0):
     """Add an approver to a proposal."""
     #
@@ -685,12 +760,10 @@ def proposal_approver(request, pid=0):
                 # here and by default in the model, which is 'level3'.
                 # if the proposal is from faculty, the approver does not
                 # replace level3 so replace is set to None.
-                did = proposal.department
-                for dept in department_all():
-                    if dept['id'] == did and dept['orbit'] == 'faculty':
-                        approver.replace = None
-                        approver.save()
-                        break
+                dept = department_detail(proposal.department)
+                if dept and dept.orbit == 'faculty':
+                    approver.replace = None
+                    approver.save()
 
                 # send an email to approver
                 prefix = 'Your Review and Authorization Required'
@@ -710,7 +783,7 @@ def proposal_approver(request, pid=0):
                     to_list = [approver.user.email]
 
                 frum = PROPOSAL_EMAIL_LIST[0]
-                send_mail(
+                queue_mail(
                     request,
                     to_list,
                     subject,
@@ -755,7 +828,7 @@ def email_investigator(request, pid, action):
                 else:
                     to_list = [proposal.user.email]
                 frum = request.user.email
-                send_mail(
+                queue_mail(
                     request,
                     to_list,
                     "[Office of Sponsored Programs] Grant Proposal: {0}".format(
@@ -786,232 +859,263 @@ def email_investigator(request, pid, action):
     )
 
 
+def _update_proposal(proposal, **changes):
+    """Set some proposal fields and write only those columns."""
+    for field, value in changes.items():
+        setattr(proposal, field, value)
+    proposal.save(update_fields=list(changes) + ['updated_at'])
+
+
+def _reset_impact(impact):
+    """Clear the Part B approvals and write only those columns."""
+    for field in IMPACT_RESET_FIELDS:
+        setattr(impact, field, False)
+    impact.save(update_fields=IMPACT_RESET_FIELDS + ['updated_at'])
+
+
 @csrf_exempt
 @login_required
+@transaction.atomic
 def proposal_status(request):
     """Set the status on a proposal."""
     # options:  approve, decline, open, close, needs work
     # method:   AJAX POST
 
     # requires POST request
-    if request.POST:
-        pid = request.POST.get('pid')
-        try:
-            pid = int(pid)
-        except ValueError:
-            return HttpResponse("Access Denied")
-        user = request.user
-        proposal = get_object_or_404(Proposal, pk=pid)
-        try:
-            impact = proposal.impact
-        except ProposalImpact.DoesNotExist:
-            impact = None
-        perms = proposal.permissions(user)
-        # if user does not have 'approve' permissions, we can stop here,
-        # regardless of whether we are approving/declining, closing/opening,
-        # or indicating that the proposal "needs work".
-        if not perms['approve'] and not perms['open']:
-            return HttpResponse("Access Denied")
+    if not request.POST:
+        return HttpResponse("Requires POST request")
+    try:
+        pid = int(request.POST.get('pid'))
+    except (TypeError, ValueError):
+        return HttpResponse("Access Denied")
+    # lock the proposal so that transitions on it run one at a time
+    proposal = get_object_or_404(Proposal.objects.select_for_update(), pk=pid)
+    # a repeated request gets the response of the first one
+    key = request.POST.get('key')
+    if key:
+        done = IdempotencyKey.objects.filter(
+            user=request.user, key=key,
+        ).first()
+        if done:
+            return HttpResponse(done.response)
+    response = _proposal_status(request, proposal)
+    # a refusal or an error is not stored, so a retry is applied afresh
+    if key and getattr(response, 'applied', False):
+        IdempotencyKey.objects.create(
+            user=request.user,
+            key=key,
+            response=response.content.decode(),
+        )
+    return response
+
+
+def _applied(message):
+    """Response for a status change that was applied to the proposal."""
+    response = HttpResponse(message)
+    response.applied = True
+    return response
+
+
+def _proposal_status(request, proposal):
+    """Apply a status change to a proposal that the caller has locked."""
+    user = request.user
+    try:
+        impact = proposal.impact
+    except ProposalImpact.DoesNotExist:
+        impact = None
+    perms = proposal.permissions(user)
+    roles = get_roles(user)
+    # if user does not have 'approve' permissions, we can stop here,
+    # regardless of whether we are approving/declining, closing/opening,
+    # or indicating that the proposal "needs work".
+    if not perms['approve'] and not perms['open']:
+        return HttpResponse("Access Denied")
+    else:
+        status = request.POST.get('status')
+        if not status:
+            return HttpResponse("No status")
+
+        # close
+        if status == 'close':
+            if perms['close']:
+                # Approvers
+                proposal.approvers.update(step1=False, step2=False)
+                # we might not have a proposal impact relationship
+                if impact:
+                    _reset_impact(impact)
+                # the proposal last so that its signals see the rest
+                _update_proposal(
+                    proposal,
+                    closed=True,
+                    opened=False,
+                    decline=False,
+                    level3=False,
+                    email_approved=False,
+                    save_submit=False,
+                )
+                record_event(proposal, user, EVENT_CLOSED)
+                return _applied("Proposal has been closed")
+            else:
+                return HttpResponse("You do not have permission to close")
+
+        # open
+        if status == 'open':
+            if perms['open']:
+                # Approvers
+                if not proposal.closed:
+                    if proposal.level3:
+                        proposal.approvers.update(step2=False)
+                    else:
+                        proposal.approvers.update(step1=False)
+                # we might not have a proposal impact relationship
+                if proposal.level3 and impact:
+                    _reset_impact(impact)
+                # reset booleans back to False
+                _update_proposal(
+                    proposal,
+                    closed=False,
+                    opened=True,
+                    decline=False,
+                    email_approved=False,
+                    save_submit=False,
+                    proposal_type='Resubmission',
+                )
+                record_event(proposal, user, EVENT_REOPENED)
+                return _applied("Proposal has been reopened")
+            else:
+                return HttpResponse("You do not have permission to open")
+
+        # find out on which step we are
+        decline_template = 'impact/email_decline.html'
+        decline_subject = 'Part B: Not approved, requires \
+            additional clarrification: "{0}"'.format(proposal.title)
+        needs_work_template = 'impact/email_needswork.html'
+        needs_work_subject = 'Part B: Needs work, requires \
+            additional clarrification: "{0}"'.format(proposal.title)
+        if not proposal.level3:
+            step = 'step1'
+            decline_template = 'proposal/email_decline.html'
+            decline_subject = 'Part A: Not approved, requires \
+                additonal clarrification: "{0}"'.format(proposal.title)
+            needs_work_template = 'proposal/email_needswork.html'
+            needs_work_subject = 'Part A: Needs work, requires \
+                additonal clarrification: "{0}"'.format(proposal.title)
+        elif proposal.level3 and not impact:
+            return HttpResponse("Step 2 has not been initiated")
+        elif impact and not proposal.save_submit:
+            return HttpResponse("Step 2 has not been completed")
         else:
-            status = request.POST.get('status')
-            if not status:
-                return HttpResponse("No status")
-
-            # close
-            if status == 'close':
-                if perms['close']:
-                    proposal.closed = True
-                    proposal.opened = False
-                    proposal.decline = False
-                    proposal.level3 = False
-                    proposal.email_approved = False
-                    proposal.save_submit = False
-                    proposal.save()
-                    # we might not have a proposal impact relationship
-                    if impact:
-                        proposal.impact.disclosure_assurance = False
-                        proposal.impact.level3 = False
-                        proposal.impact.level2 = False
-                        proposal.impact.level1 = False
-                        proposal.impact.save()
-                    # Approvers
-                    for approver in proposal.approvers.all():
-                        approver.step1 = False
-                        approver.step2 = False
-                        approver.save()
-                    return HttpResponse("Proposal has been closed")
-                else:
-                    return HttpResponse("You do not have permission to close")
-
-            # open
-            if status == 'open':
-                if perms['open']:
-                    # Approvers
-                    for approver in proposal.approvers.all():
-                        if not proposal.level3 and not proposal.closed:
-                            approver.step1 = False
-                        if proposal.level3 and not proposal.closed:
-                            approver.step2 = False
-                        approver.save()
-                    # reset booleans back to False
-                    if not proposal.level3 and not proposal.closed:
-                        proposal.level3 = False
-                    proposal.closed = False
-                    proposal.opened = True
-                    proposal.decline = False
-                    proposal.email_approved = False
-                    proposal.save_submit = False
-                    proposal.proposal_type = 'Resubmission'
-                    proposal.save()
-                    # we might not have a proposal impact relationship
-                    if proposal.level3 and impact:
-                        proposal.impact.disclosure_assurance = False
-                        proposal.impact.level3 = False
-                        proposal.impact.level2 = False
-                        proposal.impact.level1 = False
-                        proposal.impact.save()
-
-                    return HttpResponse("Proposal has been reopened")
-                else:
-                    return HttpResponse("You do not have permission to open")
-
-            # find out on which step we are
-            decline_template = 'impact/email_decline.html'
-            decline_subject = 'Part B: Not approved, requires \
-                additional clarrification: "{0}"'.format(proposal.title)
-            needs_work_template = 'impact/email_needswork.html'
-            needs_work_subject = 'Part B: Needs work, requires \
-                additional clarrification: "{0}"'.format(proposal.title)
-            if not proposal.level3:
-                step = 'step1'
-                decline_template = 'proposal/email_decline.html'
-                decline_subject = 'Part A: Not approved, requires \
-                    additonal clarrification: "{0}"'.format(proposal.title)
-                needs_work_template = 'proposal/email_needswork.html'
-                needs_work_subject = 'Part A: Needs work, requires \
-                    additonal clarrification: "{0}"'.format(proposal.title)
-            elif proposal.level3 and not impact:
-                return HttpResponse("Step 2 has not been initiated")
-            elif impact and not proposal.save_submit:
-                return HttpResponse("Step 2 has not been completed")
+            step = 'step2'
+
+        # anyone can decline, for now. i suspect that will change
+        # and thus the data model will have to change.
+        if status == 'decline':
+            if perms['decline']:
+                # Approvers
+                proposal.approvers.update(step2=False)
+                # ProposalImpact object
+                if step == 'step2':
+                    _reset_impact(impact)
+                # Proposal object
+                changes = {
+                    'decline': True,
+                    'opened': False,
+                    'email_approved': False,
+                    'save_submit': False,
+                }
+                if step == 'step1':
+                    changes['level3'] = False
+                _update_proposal(proposal, **changes)
+                record_event(proposal, user, EVENT_DECLINED)
+                # send email to PI
+                to_list = [proposal.user.email]
+                if DEBUG:
+                    proposal.to_list = to_list
+                    to_list = TEST_EMAILS
+                frum = user.email
+                queue_mail(
+                    request,
+                    to_list,
+                    decline_subject,
+                    frum,
+                    decline_template,
+                    proposal,
+                    reply_to=[frum,],
+                    bcc=bcc,
+                )
+                return _applied("Proposal Declined")
             else:
-                step = 'step2'
-
-            # anyone can decline, for now. i suspect that will change
-            # and thus the data model will have to change.
-            if status == 'decline':
-                if perms['decline']:
-                    # Proposal object
-                    proposal.decline = True
-                    proposal.opened = False
-                    proposal.email_approved = False
-                    proposal.save_submit = False
-                    if step == 'step1':
-                        proposal.level3 = False
-                    proposal.save()
-                    # ProposalImpact object
-                    if step == 'step2':
-                        proposal.impact.level1 = False
-                        proposal.impact.level2 = False
-                        proposal.impact.level3 = False
-                        proposal.impact.disclosure_assurance = False
-                        proposal.impact.save()
-                    # Approvers
-                    for approver in proposal.approvers.all():
-                        approver.step2 = False
-                        approver.save()
-                    # send email to PI
-                    to_list = [proposal.user.email]
-                    if DEBUG:
-                        proposal.to_list = to_list
-                        to_list = TEST_EMAILS
-                    frum = user.email
-                    send_mail(
-                        request,
-                        to_list,
-                        decline_subject,
-                        frum,
-                        decline_template,
-                        proposal,
-                        reply_to=[frum,],
-                        bcc=bcc,
-                    )
-                    return HttpResponse("Proposal Declined")
-                else:
-                    return HttpResponse("You don't have permission to decline")
-
-            # we can stop here if 'needs work', just like decline.
-            if status == 'needswork':
-                if perms['needswork']:
-                    # Proposal object
-                    proposal.decline = False
-                    proposal.closed = False
-                    proposal.opened = True
-                    proposal.level3 = False
-                    proposal.email_approved = False
-                    proposal.save_submit = False
-                    proposal.proposal_type = 'Revised'
-                    if step == 'step1':
-                        proposal.level3 = False
-                    proposal.save()
-                    # ProposalImpact object
-                    if step == 'step2':
-                        proposal.impact.level1 = False
-                        proposal.impact.level2 = False
-                        proposal.impact.level3 = False
-                        proposal.impact.disclosure_assurance = False
-                        proposal.impact.save()
-                    # Approvers
-                    for approver in proposal.approvers.all():
-                        approver.step1 = False
-                        approver.step2 = False
-                        approver.save()
+                return HttpResponse("You don't have permission to decline")
+
+        # we can stop here if 'needs work', just like decline.
+        if status == 'needswork':
+            if perms['needswork']:
+                # Approvers
+                proposal.approvers.update(step1=False, step2=False)
+                # ProposalImpact object
+                if step == 'step2':
+                    _reset_impact(impact)
+                # Proposal object
+                _update_proposal(
+                    proposal,
+                    decline=False,
+                    closed=False,
+                    opened=True,
+                    level3=False,
+                    email_approved=False,
+                    save_submit=False,
+                    proposal_type='Revised',
+                )
+                record_event(proposal, user, EVENT_NEEDS_WORK)
 
-                    to_list = [proposal.user.email]
-                    if DEBUG:
-                        proposal.to_list = to_list
-                        to_list = TEST_EMAILS
-                    frum = user.email
-                    send_mail(
-                        request,
-                        to_list,
-                        needs_work_subject,
-                        frum,
-                        needs_work_template,
-                        proposal,
-                        reply_to=[frum,],
-                        bcc=bcc,
-                    )
-                    return HttpResponse('Proposal "needs work" email sent')
-                else:
-                    return HttpResponse("Permission denied")
+                to_list = [proposal.user.email]
+                if DEBUG:
+                    proposal.to_list = to_list
+                    to_list = TEST_EMAILS
+                frum = user.email
+                queue_mail(
+                    request,
+                    to_list,
+                    needs_work_subject,
+                    frum,
+                    needs_work_template,
+                    proposal,
+                    reply_to=[frum,],
+                    bcc=bcc,
+                )
+                return _applied('Proposal "needs work" email sent')
+            else:
+                return HttpResponse("Permission denied")
 
-            #
-            # begin approve logic
-            #
+        #
+        # begin approve logic
+        #
 
-            # default email subject
-            subject = '{0}: "{1}"'.format(
-                'You are Approved to begin Part B',
-                proposal.title,
-            )
+        # default email subject
+        subject = '{0}: "{1}"'.format(
+            'You are Approved to begin Part B',
+            proposal.title,
+        )
 
-            # establish the email distribution list
-            to_list = [proposal.user.email]
-            if DEBUG:
-                proposal.to_list = to_list
-                to_list = TEST_EMAILS
-
-            # default message for when none of the conditions below are met
-            message = "You do not have permission to '{}'".format(status)
-            # if step1 and Division Dean
-            if step == 'step1' and perms['level3'] and not perms['approver']:
-                proposal.level3 = True
-                proposal.save()
+        # establish the email distribution list
+        to_list = [proposal.user.email]
+        if DEBUG:
+            proposal.to_list = to_list
+            to_list = TEST_EMAILS
+
+        # default message for when none of the conditions below are met
+        message = "You do not have permission to '{}'".format(status)
+        applied = False
+        # if step1 and Division Dean
+        if step == 'step1' and perms['level3'] and not perms['approver']:
+            message = "Part A has already been approved"
+            if guarded_update(proposal, {'level3': False}, level3=True):
+                record_event(proposal, user, EVENT_PART_A_DEAN)
+                applied = True
                 # send email to PI informing them that they are approved
                 # to begin Part B
                 frum = proposal.user.email
-                send_mail(
+                queue_mail(
                     request,
                     to_list,
                     subject,
@@ -1022,16 +1126,21 @@ def proposal_status(request):
                     bcc=bcc,
                 )
                 message = "Dean/VP approved Part A"
-            # if step2 and Division Dean
-            elif step == 'step2' and perms['level3'] and not perms['approver']:
-                proposal.impact.level3 = True
-                proposal.impact.save()
+        # if step2 and Division Dean
+        elif step == 'step2' and perms['level3'] and not perms['approver']:
+            message = "Part B has already been approved"
+            if guarded_update(impact, {'level3': False}, level3=True):
+                record_event(proposal, user, EVENT_PART_B_DEAN)
+                applied = True
                 message = "Division Dean approved Part B"
                 # send email to Provost and VP for Business informing
                 # them that the Division Dean has approved Part B
                 # and the proposal is awaiting their approval.
                 if proposal.ready_level1():
-                    to_list = [VEEP.email, PROVOST.email]
+                    to_list = [
+                        get_group_user(settings.CFO_GROUP).email,
+                        get_group_user(settings.PROVOST_GROUP).email,
+                    ]
                     if DEBUG:
                         proposal.to_list = to_list
                         to_list = TEST_EMAILS
@@ -1041,7 +1150,7 @@ def proposal_status(request):
                         proposal.user.first_name,
                     )
                     frum = PROPOSAL_EMAIL_LIST[0]
-                    send_mail(
+                    queue_mail(
                         request,
                         to_list,
                         subject,
@@ -1051,26 +1160,113 @@ def proposal_status(request):
                         reply_to=[frum,],
                         bcc=bcc,
                     )
-            # VP for Business?
-            elif user.id == VEEP.id and step == 'step2':
-                proposal.impact.level2 = True
-                try:
-                    approver = proposal.approvers.get(user=user)
-                    proposal.impact.level3 = True
-                    # send email to Provost to approve Part B because VEEP
-                    # was both level3 and level2 approver and provost has
-                    # not been notified yet.
-                    to_list = [PROVOST.email]
-                    subject = 'Review and Provide Final Authorization for PART B: "{0}" by {1}, {2}'.format(
-                        proposal.title,
-                        proposal.user.last_name,
-                        proposal.user.first_name,
+        # VP for Business?
+        elif roles['cfo'] and step == 'step2':
+            message = "Part B has already been approved"
+            approver = proposal.approvers.filter(user=user).first()
+            changes = {'level2': True}
+            if approver:
+                changes['level3'] = True
+            approved = guarded_update(impact, {'level2': False}, **changes)
+            if approved:
+                record_event(proposal, user, EVENT_PART_B_CFO)
+                applied = True
+                message = "VP for Business approved Part B"
+            if approved and approver:
+                # send email to Provost to approve Part B because VEEP
+                # was both level3 and level2 approver and provost has
+                # not been notified yet.
+                to_list = [get_group_user(settings.PROVOST_GROUP).email]
+                subject = 'Review and Provide Final Authorization for PART B: "{0}" by {1}, {2}'.format(
+                    proposal.title,
+                    proposal.user.last_name,
+                    proposal.user.first_name,
+                )
+                if DEBUG:
+                    proposal.to_list = to_list
+                    to_list = TEST_EMAILS
+                frum = proposal.user.email
+                queue_mail(
+                    request,
+                    to_list,
+                    subject,
+                    frum,
+                    'impact/email_approve_level1.html',
+                    proposal,
+                    reply_to=[frum,],
+                    bcc=bcc,
+                )
+        # Provost?
+        elif roles['provost'] and step == 'step2':
+            message = "Part B has already been authorized"
+            if guarded_update(impact, {'level1': False}, level1=True):
+                record_event(proposal, user, EVENT_PART_B_PROVOST)
+                applied = True
+                message = "Provost approved Part B"
+        # awarded
+        elif status == 'awarded' and perms['superuser']:
+            message = "Proposal is awarded"
+            if guarded_update(proposal, {'awarded': False}, awarded=True):
+                record_event(proposal, user, EVENT_AWARDED)
+                applied = True
+        # approvers
+        else:
+            try:
+                approver = proposal.approvers.get(user=user)
+                # a second click must not approve or send email twice
+                changes = {step: True}
+                if not guarded_update(approver, {step: False}, **changes):
+                    return HttpResponse("You have already approved this")
+                applied = True
+                if step == 'step1':
+                    record_event(proposal, user, EVENT_PART_A_APPROVER)
+                else:
+                    record_event(proposal, user, EVENT_PART_B_APPROVER)
+                # if approver replaces Division Dean set level3 to True
+                logger.debug('step = {0} perms={1}'.format(step, perms))
+                if approver.replace == 'level3':
+                    if step == 'step1':
+                        if guarded_update(
+                            proposal, {'level3': False}, level3=True,
+                        ):
+                            record_event(proposal, user, EVENT_PART_A_DEAN)
+                    elif guarded_update(
+                        impact, {'level3': False}, level3=True,
+                    ):
+                        record_event(proposal, user, EVENT_PART_B_DEAN)
+                # if step 1 is complete send email notification
+                if (proposal.level3 and step == 'step1'):
+                    frum = proposal.user.email
+                    queue_mail(
+                        request,
+                        to_list,
+                        subject,
+                        frum,
+                        'proposal/email_authorized.html',
+                        proposal,
+                        reply_to=[frum,],
+                        bcc=bcc,
                     )
+                # if step 2 is complete and we are ready for
+                # VP for Business and Provost to weight in, send email
+                if proposal.ready_level1():
+                    to_list = [
+                        get_group_user(settings.CFO_GROUP).email,
+                        get_group_user(settings.PROVOST_GROUP).email,
+                    ]
                     if DEBUG:
                         proposal.to_list = to_list
                         to_list = TEST_EMAILS
-                    frum = proposal.user.email
-                    send_mail(
+                    subject = (
+                        'Review & Provide Final Authorization for PART B: '
+                        '"{0}" by {1}, {2}'
+                    ).format(
+                        proposal.title,
+                        proposal.user.last_name,
+                        proposal.user.first_name,
+                    )
+                    frum = PROPOSAL_EMAIL_LIST[0]
+                    queue_mail(
                         request,
                         to_list,
                         subject,
@@ -1080,90 +1276,16 @@ def proposal_status(request):
                         reply_to=[frum,],
                         bcc=bcc,
                     )
-                except ProposalApprover.DoesNotExist:
-                    pass
-                proposal.impact.save()
-                message = "VP for Business approved Part B"
-            # Provost?
-            elif user.id == PROVOST.id and step == 'step2':
-                proposal.impact.level1 = True
-                proposal.impact.save()
-                message = "Provost approved Part B"
-            # awarded
-            elif status == 'awarded' and perms['superuser']:
-                proposal.awarded = True
-                proposal.save()
-                message = "Proposal is awarded"
-            # approvers
-            else:
-                try:
-                    approver = proposal.approvers.filter(user=user)[0]
-                    approver.__dict__[step] = True
-                    approver.save()
-                    # if approver replaces Division Dean set level3 to True
-                    logger.debug('step = {0} perms={1}'.format(step, perms))
-                    if approver.replace == 'level3':
-                        if step == 'step1':
-                            proposal.level3 = True
-                            if proposal.proposal_type == 'revised':
-                                proposal.proposal_type == 'Resubmission'
-                            proposal.save()
-                            approver.step1 = True
-                            approver.save()
-                        else:
-                            proposal.impact.level3 = True
-                            proposal.impact.save()
-                            approver.step2 = True
-                            approver.save()
-                    # if step 1 is complete send email notification
-                    if (proposal.level3 and step == 'step1'):
-                        frum = proposal.user.email
-                        send_mail(
-                            request,
-                            to_list,
-                            subject,
-                            frum,
-                            'proposal/email_authorized.html',
-                            proposal,
-                            reply_to=[frum,],
-                            bcc=bcc,
-                        )
-                    # if step 2 is complete and we are ready for
-                    # VP for Business and Provost to weight in, send email
-                    if proposal.ready_level1():
-                        to_list = [VEEP.email, PROVOST.email]
-                        if DEBUG:
-                            proposal.to_list = to_list
-                            to_list = TEST_EMAILS
-                        subject = (
-                            'Review & Provide Final Authorization for PART B: '
-                            '"{0}" by {1}, {2}'
-                        ).format(
-                            proposal.title,
-                            proposal.user.last_name,
-                            proposal.user.first_name,
-                        )
-                        frum = PROPOSAL_EMAIL_LIST[0]
-                        send_mail(
-                            request,
-                            to_list,
-                            subject,
-                            frum,
-                            'impact/email_approve_level1.html',
-                            proposal,
-                            reply_to=[frum,],
-                            bcc=bcc,
-                        )
-                    message = "Approved by {0} {1}".format(
-                        approver.user.first_name,
-                        approver.user.last_name,
-                    )
-                except ProposalApprover.DoesNotExist as error:
-                    message = """
-                        There was a problem setting the status for this proposal: {0}
-                    """.format(error)
-    else:
-        message = "Requires POST request"
+                message = "Approved by {0} {1}".format(
+                    approver.user.first_name,
+                    approver.user.last_name,
+                )
+            except ProposalApprover.DoesNotExist as error:
+                message = """
+                    There was a problem setting the status for this proposal: {0}
+                """.format(error)
+        if applied:
+            return _applied(message)
 
     return HttpResponse(message)
 
@@ -1172,24 +1294,21 @@ def proposal_status(request):
 @login_required
 def clear_cache(request, ctype='blurbs'):
     """Clear the cache for API content."""
+    if ctype == 'workday':
+        if not in_group(request.user, OSP_GROUP):
+            return HttpResponse("Access Denied")
+        clear_workday_cache()
+        return HttpResponse("Workday cache cleared")
     cid = request.POST.get('cid')
     request_type = 'post'
     if not cid:
         cid = request.GET.get('cid')
         request_type = 'get'
     if cid:
-        key = 'livewhale_{0}_{1}'.format(ctype, cid)
-        cache.delete(key)
-        timestamp = datetime.timestamp(datetime.now())
-        earl = '{0}/live/{1}/{2}@JSON?cache={3}'.format(
-            settings.LIVEWHALE_API_URL, ctype, cid, timestamp,
-        )
-        try:
-            response = requests.get(earl, headers={'Cache-Control': 'no-cache'})
-            text = json.loads(response.text)
-            cache.set(key, text)
-            api_data = mark_safe(text['body'])
-        except ValueError:
+        content = livewhale.refresh(ctype, cid)
+        if content:
+            api_data = mark_safe(content['body'])
+        else:
             api_data = "Cache was not cleared."
         if request_type == 'post':
             content_type = 'text/plain; charset=utf-8'
@@ -1201,6 +1320,56 @@ def clear_cache(request, ctype='blurbs'):
     return HttpResponse(api_data, content_type=content_type)
 
 
+@login_required
+def livewhale_stats(request):
+    """Hit, stale, miss, refresh, and error counts for API content."""
+    if not in_group(request.user, OSP_GROUP):
+        return HttpResponse("Access Denied")
+    return JsonResponse(livewhale.stats())
+
+
+@login_required
+def sla_report(request):
+    """Time that proposals wait in each approval stage, from the rollup."""
+    if not in_group(request.user, OSP_GROUP):
+        return HttpResponse("Access Denied")
+    rollups = StageRollup.objects.all()
+    try:
+        day = datetime.date.fromisoformat(request.GET.get('day', ''))
+    except ValueError:
+        # the latest rollup
+        day = rollups.aggregate(day=Max('day'))['day']
+    rollups = rollups.filter(day=day).select_related('approver')
+    stages = dict(SLA_STAGE_CHOICES)
+    depts = {dept['id']: dept['name'] for dept in department_all()}
+    overall = []
+    departments = []
+    approvers = []
+    for rollup in sorted(
+        rollups, key=lambda rollup: list(stages).index(rollup.stage),
+    ):
+        if rollup.approver:
+            approvers.append(rollup)
+        elif rollup.department:
+            rollup.department_name = depts.get(
+                rollup.department, rollup.department,
+            )
+            departments.append(rollup)
+        else:
+            overall.append(rollup)
+    return render(
+        request,
+        'sla_report.html',
+        {
+            'day': day,
+            'window': settings.SLA_WINDOW_DAYS,
+            'overall': overall,
+            'departments': departments,
+            'approvers': approvers,
+        },
+    )
+
+
 @login_required
 def proposal_success(request):
     """Redirect here after user submits Part A."""
@@ -0,0 +1,220 @@
+# -*- coding: utf-8 -*-
+
+"""Cached lookups for the Workday organisation data.
+
+The data come from the local copy of the Workday hierarchy that the
+workday_sync management command maintains, so that no request depends
+on the Workday database.
+"""
+
+import hashlib
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.apps import apps
+from django.conf import settings
+from django.core.cache import cache
+from django.core.signals import request_finished
+from django.core.signals import request_started
+from django.db import DatabaseError
+from django.db import close_old_connections
+from django.dispatch import receiver
+from djtools.utils import workday as djtools_workday
+
+
+logger = logging.getLogger('debug_logfile')
+VERSION_KEY = 'workday_version'
+# per-request memo: set when a request starts, dropped when it finishes
+_local = threading.local()
+# one thread per worker process copies new people from Workday
+_executor = ThreadPoolExecutor(max_workers=1)
+# seconds before a failed copy of a new person is tried again
+SYNC_PERSON_RETRY = 300
+
+
+@receiver(request_started)
+def workday_memo_start(sender, **kwargs):
+    """Start a fresh memo for the request."""
+    _local.memo = {}
+
+
+@receiver(request_finished)
+def workday_memo_finish(sender, **kwargs):
+    """Drop the memo so that nothing outlives the request."""
+    _local.memo = None
+
+
+def workday_version():
+    """Return the current generation of the cached Workday data."""
+    return cache.get_or_set(VERSION_KEY, 1, None)
+
+
+def _lookup(func, *args, **kwargs):
+    """Return the result of a lookup function from the cache."""
+    memo = getattr(_local, 'memo', None)
+    signature = repr((func.__name__, args, sorted(kwargs.items())))
+    if memo is not None and signature in memo:
+        return memo[signature]
+    key = 'workday_{0}_{1}_{2}'.format(
+        func.__name__,
+        workday_version(),
+        hashlib.md5(signature.encode()).hexdigest(),
+    )
+    # wrap the value so that an empty result is still a cache hit
+    cached = cache.get(key)
+    if cached is None:
+        cached = (func(*args, **kwargs),)
+        cache.set(key, cached, settings.WORKDAY_CACHE_TIMEOUT)
+    if memo is not None:
+        memo[signature] = cached[0]
+    return cached[0]
+
+
+def clear_workday_cache():
+    """Invalidate all cached Workday data in every process."""
+    try:
+        cache.incr(VERSION_KEY)
+    except ValueError:
+        cache.set(VERSION_KEY, 1, None)
+    if getattr(_local, 'memo', None) is not None:
+        _local.memo = {}
+
+
+def _managers(mtype, cid=None):
+    """Deans or chairs with the IDs of the departments they manage."""
+    rows = apps.get_model('core', 'WorkdayManager').objects.filter(role=mtype)
+    if cid is not None:
+        rows = rows.filter(cid=cid)
+    managers = {}
+    for row in rows.values('cid', 'email', 'department_id'):
+        man = managers.setdefault(
+            row['cid'],
+            {'id': row['cid'], 'email': row['email'], 'managed': []},
+        )
+        man['managed'].append(row['department_id'])
+    if cid is not None:
+        return managers.get(int(cid))
+    return list(managers.values())
+
+
+def _department_dean(did):
+    """The dean who manages a department."""
+    row = apps.get_model('core', 'WorkdayManager').objects.filter(
+        role='deans', department_id=did,
+    ).values('cid').first()
+    if row:
+        return _managers('deans', cid=row['cid'])
+    return None
+
+
+def _departments(rows, choices):
+    """Department dictionaries or choices for a select field."""
+    rows = rows.order_by('name')
+    if choices:
+        return list(rows.values_list('id', 'name'))
+    return list(rows.values('id', 'name', 'orbit'))
+
+
+def _department_all(choices=False):
+    """All departments."""
+    return _departments(
+        apps.get_model('core', 'WorkdayDepartment').objects.all(), choices,
+    )
+
+
+def _department_person(cid, choices=False):
+    """Departments to which a person belongs.
+
+    A person who is new since the last sync has none until they are
+    copied in the background, so the request never waits on Workday.
+    """
+    people = apps.get_model('core', 'WorkdayPerson').objects.filter(cid=cid)
+    if not people.exists():
+        _sync_person_later(cid)
+        return []
+    return _departments(
+        apps.get_model('core', 'WorkdayDepartment').objects.filter(
+            people__cid=cid,
+        ),
+        choices,
+    )
+
+
+def _department_detail(did):
+    """A department or None."""
+    return apps.get_model('core', 'WorkdayDepartment').objects.filter(
+        pk=did,
+    ).first()
+
+
+def _sync_person_later(cid):
+    """Copy a person in the background unless that is already under way."""
+    lock = 'workday_person_lock_{0}'.format(cid)
+    if cache.add(lock, 1, SYNC_PERSON_RETRY):
+        _executor.submit(_sync_person_and_unlock, cid, lock)
+
+
+def _sync_person_and_unlock(cid, lock):
+    """Copy a person and make the cached lookups see them.
+
+    After a failure the lock is kept until it expires, so a slow or
+    down Workday is tried at most once per SYNC_PERSON_RETRY seconds.
+    """
+    close_old_connections()
+    try:
+        if sync_person(cid):
+            clear_workday_cache()
+    except DatabaseError as error:
+        logger.debug('workday person {0}: {1}'.format(cid, error))
+        return
+    cache.delete(lock)
+
+
+def sync_person(cid):
+    """Copy the departments to which a person belongs from Workday.
+
+    Returns the number of departments that were added.
+    """
+    department = apps.get_model('core', 'WorkdayDepartment')
+    person = apps.get_model('core', 'WorkdayPerson')
+    live = {dept['id'] for dept in djtools_workday.department_person(cid)}
+    # only departments that we know about
+    live = set(
+        department.objects.filter(pk__in=live).values_list('pk', flat=True),
+    )
+    people = person.objects.filter(cid=cid)
+    people.exclude(department_id__in=live).delete()
+    known = set(people.values_list('department_id', flat=True))
+    return len(person.objects.bulk_create([
+        person(cid=cid, department_id=did) for did in live - known
+    ]))
+
+
+def get_managers(mtype, cid=None):
+    """Deans or chairs, or the one with the given ID if they are one.
+
+    A manager is a dictionary with the 'id', 'email', and 'managed' keys,
+    'managed' being the list of department IDs.
+    """
+    return _lookup(_managers, mtype, cid=cid)
+
+
+def department_dean(did):
+    """The dean who manages a department, if it has one."""
+    return _lookup(_department_dean, did)
+
+
+def department_all(choices=False):
+    """All departments."""
+    return _lookup(_department_all, choices=choices)
+
+
+def department_person(cid, choices=False):
+    """Departments to which a person belongs."""
+    return _lookup(_department_person, cid, choices=choices)
+
+
+def department_detail(did):
+    """Department details."""
+    return _lookup(_department_detail, did)
@@ -180,6 +180,32 @@ if DEBUG:
     PROPOSAL_EMAIL_LIST = []
 else:
     PROPOSAL_EMAIL_LIST = []
+# seconds to cache Workday manager and department lookups
+WORKDAY_CACHE_TIMEOUT = 60
+# seconds to cache the resolved workflow roles of a user
+ROLES_CACHE_TIMEOUT = 3600
+# number of proposals per dashboard page
+DASHBOARD_PAGE_SIZE = 50
+# seconds to keep a rendered dashboard that nothing has made stale
+DASHBOARD_CACHE_TIMEOUT = 86400
+# outbox: messages per batch, attempts before giving up, and the retry
+# delay in seconds, which doubles with each failed attempt up to the max
+OUTBOX_BATCH_SIZE = 50
+OUTBOX_MAX_ATTEMPTS = 8
+OUTBOX_RETRY_DELAY = 60
+OUTBOX_RETRY_MAX_DELAY = 3600
+# seconds to keep the idempotency keys of applied status changes, which
+# outbox_send purges after each pass
+IDEMPOTENCY_KEY_TTL = 86400
+# LiveWhale API content: seconds before cached content is refreshed in
+# the background, and the (connect, read) timeouts in seconds
+LIVEWHALE_CACHE_FRESH = 300
+LIVEWHALE_TIMEOUT = (3, 10)
+# days of completed approvals that each daily SLA rollup covers
+SLA_WINDOW_DAYS = 90
+# days before the proposal deadline that pending actions are in the
+# daily reminder digest
+REMINDER_DAYS = 14
 # approval level positions
 PROVOST_GROUP = 'Provost'
 CFO_GROUP = 'CFO'